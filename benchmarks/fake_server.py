@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor local que imita as APIs do AWX e do NetBox usadas pela sincronização.
+
+Atende, na mesma porta:
+- AWX: /api/v2/, /api/v2/inventories/, /api/v2/inventories/{id}/hosts/, /api/v2/inventories/{id}/groups/,
+  /api/v2/hosts/ (?inventory=), /api/v2/hosts/{id}/, /api/v2/hosts/{id}/groups/, /api/v2/groups/{id}/hosts/
+  (paginação page/page_size, filtros modified__gt e name__icontains), /api/v2/inventory_updates/
+  (filtros status e finished__gt, order_by) e POST /api/v2/inventories/{id}/update_inventory_sources/,
+  que simula a sincronização da fonte do inventário alterando alguns hosts;
+- NetBox: /api/<app>/<modelo>/ com paginação limit/offset, filtros usados pelos scripts, brief=1 e
+  POST/PATCH/DELETE em lote (ou em um único objeto via /api/<app>/<modelo>/{id}/).
+
+- NetBox GraphQL: POST /graphql/ com a consulta de estado da sincronização (virtual_machine_list
+  paginada, com interfaces, IPs e tags, e tag_list).
+
+Respostas GET levam ETag e atendem If-None-Match com 304.
+
+Uso isolado: python3 benchmarks/fake_server.py --hosts 10000 --port 8080 --latency-ms 5
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+AWX_DEFAULT_PAGE_SIZE = 25
+AWX_MAX_PAGE_SIZE = 200
+NETBOX_DEFAULT_LIMIT = 50
+NETBOX_MAX_LIMIT = 1000
+
+# Endpoints do NetBox cujos objetos têm nome único
+UNIQUE_NAME_ENDPOINTS = {
+    "dcim/sites", "virtualization/cluster-types", "virtualization/clusters",
+    "dcim/device-roles", "tenancy/tenants", "extras/tags", "virtualization/virtual-machines",
+}
+
+# Campos que o NetBox devolve como objetos aninhados
+NESTED_FIELDS = ("site", "cluster", "type", "role", "tenant", "primary_ip4", "primary_ip6", "virtual_machine")
+
+# Campos mantidos na representação resumida (brief=1) de cada endpoint
+BRIEF_FIELDS = {
+    "virtualization/interfaces": ("id", "url", "display", "virtual_machine", "name"),
+    "ipam/ip-addresses": ("id", "url", "display", "family", "address"),
+}
+
+# Parâmetros que controlam a paginação/representação e não filtram resultados
+CONTROL_PARAMS = {"limit", "offset", "brief", "ordering", "page", "page_size", "fields"}
+
+ROLES = [f"Função {i}" for i in range(10)]
+TENANTS = [f"Entidade {i}" for i in range(30)]
+ENVIRONMENTS = ["Produção", "Homologação", "Desenvolvimento"]
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _awx_now():
+    """Carimbo de data no formato do AWX (comparável como texto com 'modified' dos hosts)."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def generate_inventory(host_count, facts_kb=4, seed=42, vcenters=1):
+    """Gera um inventário sintético do AWX com `host_count` VMs e ~`facts_kb` KB de facts por host.
+
+    Com `vcenters` > 1 as VMs são distribuídas entre vários inventários, cada um com seu datacenter e cluster.
+    """
+    rng = random.Random(seed)
+    padding = "x" * max(0, facts_kb * 1024 - 600)
+    groups = [{"id": gid, "name": name} for gid, name in enumerate(
+        ["vmware"] + [f"role_{i}" for i in range(len(ROLES))] + [f"tenant_{i}" for i in range(len(TENANTS))], start=1)]
+    hosts = []
+    for host_id in range(1, host_count + 1):
+        name = f"vm-{host_id:06d}"
+        vcenter = (host_id - 1) % vcenters
+        role, tenant = rng.randrange(len(ROLES)), rng.randrange(len(TENANTS))
+        variables = {
+            "vm_name": name,
+            "vm_guest_os": rng.choice(["Ubuntu Linux (64-bit)", "Red Hat Enterprise Linux 8 (64-bit)", "Microsoft Windows Server 2019 (64-bit)"]),
+            "vm_power_state": "poweredOn" if rng.random() > 0.1 else "poweredOff",
+            "vm_cpu_count": rng.choice([1, 2, 4, 8]),
+            "vm_memory_mb": rng.choice([1024, 2048, 4096, 8192, 16384]),
+            "vm_memory_gb": 0,
+            "vm_disk_total_gb": rng.choice([20, 40, 80, 160]),
+            "vm_datacenter": "ATI-SLC-HCI" if vcenter == 0 else f"DC-{vcenter + 1}",
+            "vm_cluster": "Cluster vSAN" if vcenter == 0 else f"Cluster {vcenter + 1}",
+            "vm_uuid": f"4210{host_id:028x}",
+            "vm_ip_addresses": [f"10.{host_id // 65536}.{(host_id // 256) % 256}.{host_id % 256}"],
+            "vm_tags": [
+                {"name": ROLES[role], "category": "Função", "description": ""},
+                {"name": TENANTS[tenant], "category": "Entidade", "description": ""},
+                {"name": rng.choice(ENVIRONMENTS), "category": "Ambiente", "description": ""},
+            ],
+            "vm_facts": {"guest": {"padding": padding}},
+        }
+        variables["vm_memory_gb"] = variables["vm_memory_mb"] // 1024
+        hosts.append({
+            "id": host_id, "name": name, "description": "", "enabled": True, "inventory": vcenter + 1,
+            "modified": "2026-01-01T00:00:00.000000Z",
+            "variables": json.dumps(variables),
+            "group_ids": [1, 2 + role, 2 + len(ROLES) + tenant],
+        })
+    inventories = [
+        {"id": vcenter + 1, "name": "VMware Inventory" if vcenter == 0 else f"VMware Inventory {vcenter + 1}",
+         "description": "Inventário sintético"}
+        for vcenter in range(vcenters)
+    ]
+    return {"inventories": inventories, "hosts": hosts, "groups": groups}
+
+
+class FakeState:
+    """Estado em memória dos dois serviços, com contadores de requisições por endpoint."""
+
+    def __init__(self, inventory, latency_ms=0):
+        self.inventory = inventory
+        self.hosts_by_id = {host["id"]: host for host in inventory["hosts"]}
+        self.groups_by_id = {group["id"]: group for group in inventory["groups"]}
+        self.latency = latency_ms / 1000.0
+        self.objects = {}
+        self.next_id = 1
+        self.inventory_updates = []
+        self.lock = threading.RLock()
+        self.requests = Counter()
+        self.bytes_sent = 0
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests.clear()
+            self.bytes_sent = 0
+
+    def stats(self):
+        with self.lock:
+            return {"requests": sum(self.requests.values()), "bytes_sent": self.bytes_sent,
+                    "by_endpoint": {f"{method} {path}": n for (method, path), n in sorted(self.requests.items())}}
+
+    # --- AWX ---
+
+    def awx_host(self, host):
+        groups = [self.groups_by_id[gid] for gid in host["group_ids"]]
+        public = {key: value for key, value in host.items() if key != "group_ids"}
+        public["summary_fields"] = {"groups": {"count": len(groups), "results": groups[:5]}}
+        return public
+
+    def awx_hosts(self, query, inventory_id=None):
+        since = query.get("modified__gt", [""])[0]
+        name_filter = query.get("name__icontains", [""])[0].lower()
+        return [self.awx_host(host) for host in self.inventory["hosts"]
+                if (inventory_id is None or host["inventory"] == inventory_id) and host["modified"] > since
+                and name_filter in host["name"].lower()]
+
+    def update_inventory_source(self, inventory_id, changed_hosts=1):
+        """Simula a sincronização da fonte de um inventário: altera a CPU de alguns hosts e registra a atualização."""
+        hosts = [host for host in self.inventory["hosts"] if host["inventory"] == inventory_id]
+        for host in hosts[:changed_hosts]:
+            variables = json.loads(host["variables"])
+            variables["vm_cpu_count"] = variables["vm_cpu_count"] % 16 + 1
+            host["variables"] = json.dumps(variables)
+            host["modified"] = _awx_now()
+        update = {"id": len(self.inventory_updates) + 1, "type": "inventory_update", "inventory": inventory_id,
+                  "inventory_source": inventory_id, "status": "successful", "finished": _awx_now()}
+        self.inventory_updates.append(update)
+        return update
+
+    def awx_inventory_updates(self, query):
+        status = query.get("status", [None])[0]
+        since = query.get("finished__gt", [""])[0]
+        updates = [update for update in self.inventory_updates
+                   if (status is None or update["status"] == status) and update["finished"] > since]
+        return sorted(updates, key=lambda update: update["finished"], reverse=query.get("order_by", [""])[0] == "-finished")
+
+    # --- NetBox ---
+
+    def table(self, endpoint):
+        return self.objects.setdefault(endpoint, {})
+
+    def _nest(self, field, value):
+        if value is None or isinstance(value, dict):
+            return value
+        for objects in self.objects.values():
+            target = objects.get(value)
+            if target is not None:
+                return {key: target[key] for key in ("id", "name", "slug", "address") if key in target}
+        return {"id": value}
+
+    def store(self, endpoint, data, existing=None):
+        """Converte um payload de escrita na representação de leitura do NetBox."""
+        obj = dict(existing or {})
+        for field, value in data.items():
+            if field in NESTED_FIELDS:
+                value = self._nest(field, value)
+            elif field == "tags":
+                value = [self._nest(field, tag) for tag in value or []]
+            elif field == "status" and isinstance(value, str):
+                value = {"value": value, "label": value.title()}
+            obj[field] = value
+        if endpoint == "ipam/ip-addresses" and obj.get("assigned_object_id") is not None:
+            obj["assigned_object"] = {"id": obj["assigned_object_id"]}
+        if endpoint == "ipam/ip-addresses":
+            family = 6 if ":" in obj.get("address", "") else 4
+            obj["family"] = {"value": family, "label": f"IPv{family}"}
+        obj["display"] = obj.get("name") or obj.get("address") or str(obj.get("id"))
+        obj["url"] = f"/api/{endpoint}/{obj['id']}/"
+        obj["last_updated"] = _now()
+        obj.setdefault("created", obj["last_updated"])
+        return obj
+
+    def cascade_delete(self, endpoint, ids):
+        """Efeitos de uma remoção nos objetos relacionados, como no NetBox."""
+        ids = set(ids)
+        if endpoint == "virtualization/virtual-machines":
+            interfaces = self.table("virtualization/interfaces")
+            removed = [i for i, iface in interfaces.items() if (iface.get("virtual_machine") or {}).get("id") in ids]
+            for i in removed:
+                del interfaces[i]
+            self.cascade_delete("virtualization/interfaces", removed)
+        elif endpoint == "virtualization/interfaces":
+            for ip in self.table("ipam/ip-addresses").values():
+                if ip.get("assigned_object_type") == "virtualization.vminterface" and ip.get("assigned_object_id") in ids:
+                    ip.update(assigned_object_type=None, assigned_object_id=None, assigned_object=None)
+        elif endpoint == "ipam/ip-addresses":
+            for vm in self.table("virtualization/virtual-machines").values():
+                for field in ("primary_ip4", "primary_ip6"):
+                    if (vm.get(field) or {}).get("id") in ids:
+                        vm[field] = None
+
+    def validate(self, endpoint, payload, names, existing_id=None):
+        """Retorna a mensagem de erro de validação do payload, ou None.
+
+        `names` mapeia nome -> ID dos objetos já existentes e dos anteriores no mesmo lote.
+        """
+        if endpoint in UNIQUE_NAME_ENDPOINTS:
+            name = payload.get("name")
+            if existing_id is None and not name:
+                return {"name": ["Este campo é obrigatório."]}
+            if name is not None and names.get(name, existing_id) != existing_id:
+                return {"name": [f"Já existe um objeto com o nome '{name}'."]}
+        return None
+
+    def predicate(self, field, values):
+        """Função de filtro equivalente ao filtro `field` do NetBox, ou None se o filtro for ignorado."""
+        wanted = set(values)
+        if field == "last_updated__gte":
+            return lambda obj: obj.get("last_updated", "") >= values[0]
+        if field == "vminterface_id":
+            return lambda obj: str(obj.get("assigned_object_id")) in wanted
+        if field == "address":
+            hosts = {value.split("/")[0] for value in values}
+            return lambda obj: obj.get("address", "").split("/")[0] in hosts
+        if field.endswith("_id"):
+            key = field[:-3]
+            return lambda obj: isinstance(obj.get(key), dict) and str(obj[key].get("id")) in wanted
+        if field in ("id", "name", "slug"):
+            return lambda obj: str(obj.get(field)) in wanted
+        return None  # Filtros desconhecidos são ignorados, como no NetBox
+
+    def query(self, endpoint, query):
+        objects = list(self.table(endpoint).values())
+        for field, values in query.items():
+            predicate = None if field in CONTROL_PARAMS else self.predicate(field, values)
+            if predicate is not None:
+                objects = [obj for obj in objects if predicate(obj)]
+        if "brief" in query and endpoint in BRIEF_FIELDS:
+            objects = [{key: obj.get(key) for key in BRIEF_FIELDS[endpoint]} for obj in objects]
+        return objects
+
+    def graphql(self, body):
+        """Responde à consulta de estado da sincronização (virtual_machine_list paginada e tag_list).
+
+        Não interpreta GraphQL: devolve sempre a mesma projeção, com IDs como strings, como o NetBox.
+        """
+        query, variables = body.get("query", ""), body.get("variables") or {}
+        if "virtual_machine_list" not in query:
+            return {"errors": [{"message": "Consulta não suportada pelo servidor fake."}]}
+        ref = lambda value: {"id": str(value["id"])} if value else None
+        ips_by_interface = {}
+        for ip in self.table("ipam/ip-addresses").values():
+            if ip.get("assigned_object_type") == "virtualization.vminterface":
+                ips_by_interface.setdefault(ip["assigned_object_id"], []).append({"id": str(ip["id"]), "address": ip["address"]})
+        interfaces_by_vm = {}
+        for iface in self.table("virtualization/interfaces").values():
+            interfaces_by_vm.setdefault(iface["virtual_machine"]["id"], []).append(
+                {"id": str(iface["id"]), "name": iface["name"], "ip_addresses": ips_by_interface.get(iface["id"], [])})
+        offset, limit = int(variables.get("offset", 0)), int(variables.get("limit", NETBOX_MAX_LIMIT))
+        vms = sorted(self.table("virtualization/virtual-machines").values(), key=lambda vm: vm["id"])[offset:offset + limit]
+        data = {"virtual_machine_list": [{
+            "id": str(vm["id"]), "name": vm["name"], "status": (vm.get("status") or {}).get("value"),
+            "vcpus": vm.get("vcpus"), "memory": vm.get("memory"), "disk": vm.get("disk"), "comments": vm.get("comments", ""),
+            **{field: ref(vm.get(field)) for field in ("site", "cluster", "role", "tenant", "primary_ip4", "primary_ip6")},
+            "tags": [ref(tag) for tag in vm.get("tags") or []],
+            "interfaces": interfaces_by_vm.get(vm["id"], []),
+        } for vm in vms]}
+        if variables.get("tags"):
+            data["tag_list"] = [{"id": str(tag["id"]), "name": tag["name"], "slug": tag["slug"]}
+                                for tag in self.table("extras/tags").values()]
+        return {"data": data}
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # FakeState, definido por make_server
+
+    def log_message(self, *args):
+        pass
+
+    # --- infraestrutura ---
+
+    def _send(self, status, body=None):
+        raw = json.dumps(body).encode() if body is not None else b""
+        # GETs levam ETag e respondem 304 a um If-None-Match igual (revalidação do cache HTTP)
+        etag = f'"{hashlib.sha1(raw).hexdigest()}"' if self.command == "GET" and status == 200 else None
+        if etag and self.headers.get("If-None-Match") == etag:
+            status, raw = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(raw)
+        with self.state.lock:
+            self.state.bytes_sent += len(raw)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def _route(self):
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip("/") + "/"
+        query = parse_qs(parts.query)
+        segments = [segment for segment in path.split("/") if segment]
+        # Contabiliza por endpoint, trocando IDs por '{id}'
+        label = "/" + "/".join("{id}" if segment.isdigit() else segment for segment in segments) + "/"
+        with self.state.lock:
+            self.state.requests[(self.command, label)] += 1
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        return path, query, segments
+
+    def _page_awx(self, path, items, query):
+        page_size = min(int(query.get("page_size", [AWX_DEFAULT_PAGE_SIZE])[0]), AWX_MAX_PAGE_SIZE)
+        page = int(query.get("page", ["1"])[0])
+        params = [(key, value) for key, values in query.items() if key not in ("page", "page_size") for value in values]
+        start = (page - 1) * page_size
+
+        def link(number):
+            return f"{path}?{urlencode(params + [('page', number), ('page_size', page_size)])}"
+
+        self._send(200, {
+            "count": len(items),
+            "next": link(page + 1) if start + page_size < len(items) else None,
+            "previous": link(page - 1) if page > 1 else None,
+            "results": items[start:start + page_size],
+        })
+
+    def _page_netbox(self, path, items, query):
+        limit = min(int(query.get("limit", [NETBOX_DEFAULT_LIMIT])[0]) or NETBOX_MAX_LIMIT, NETBOX_MAX_LIMIT)
+        offset = int(query.get("offset", ["0"])[0])
+        params = [(key, value) for key, values in query.items() if key not in ("limit", "offset") for value in values]
+        base = f"http://{self.headers.get('Host')}{path}"
+
+        def link(new_offset):
+            return f"{base}?{urlencode(params + [('limit', limit), ('offset', new_offset)])}"
+
+        self._send(200, {
+            "count": len(items),
+            "next": link(offset + limit) if offset + limit < len(items) else None,
+            "previous": link(max(0, offset - limit)) if offset else None,
+            "results": items[offset:offset + limit],
+        })
+
+    # --- AWX ---
+
+    def _awx_get(self, path, query, segments):
+        state = self.state
+        rest = segments[2:]
+        if not rest:
+            return self._send(200, {"current_user": {"username": "bench"}})
+        if rest == ["inventories"]:
+            return self._page_awx(path, state.inventory["inventories"], query)
+        if len(rest) == 3 and rest[0] == "inventories" and rest[2] == "hosts":
+            return self._page_awx(path, state.awx_hosts(query, int(rest[1])), query)
+        if len(rest) == 3 and rest[0] == "inventories" and rest[2] == "groups":
+            return self._page_awx(path, state.inventory["groups"], query)
+        if rest == ["hosts"]:
+            inventory = query.get("inventory", [None])[0]
+            return self._page_awx(path, state.awx_hosts(query, int(inventory) if inventory else None), query)
+        if len(rest) >= 2 and rest[0] == "hosts" and rest[1].isdigit():
+            host = state.hosts_by_id.get(int(rest[1]))
+            if host is None:
+                return self._send(404, {"detail": "Não encontrado."})
+            if len(rest) == 2:
+                return self._send(200, state.awx_host(host))
+            if rest[2] == "groups":
+                return self._page_awx(path, [state.groups_by_id[gid] for gid in host["group_ids"]], query)
+        if len(rest) == 3 and rest[0] == "groups" and rest[2] == "hosts":
+            group_id = int(rest[1])
+            members = [state.awx_host(host) for host in state.inventory["hosts"] if group_id in host["group_ids"]]
+            return self._page_awx(path, members, query)
+        if rest == ["inventory_updates"]:
+            with state.lock:
+                return self._page_awx(path, state.awx_inventory_updates(query), query)
+        self._send(404, {"detail": "Não encontrado."})
+
+    def _awx_post(self, segments):
+        rest = segments[2:]
+        if len(rest) == 3 and rest[0] == "inventories" and rest[2] == "update_inventory_sources":
+            body = self._body() or {}
+            with self.state.lock:
+                update = self.state.update_inventory_source(int(rest[1]), int(body.get("changed_hosts", 1)))
+            return self._send(202, [{"inventory_update": update["id"], "status": "started"}])
+        self._send(404, {"detail": "Não encontrado."})
+
+    # --- NetBox ---
+
+    def _netbox_target(self, segments):
+        """Retorna (endpoint, id) a partir de /api/<app>/<modelo>/[<id>/]."""
+        rest = segments[1:]
+        if len(rest) == 3 and rest[2].isdigit():
+            return "/".join(rest[:2]), int(rest[2])
+        return "/".join(rest[:2]), None
+
+    def _netbox_get(self, path, query, segments):
+        endpoint, object_id = self._netbox_target(segments)
+        if object_id is not None:
+            obj = self.state.table(endpoint).get(object_id)
+            return self._send(200, obj) if obj else self._send(404, {"detail": "Não encontrado."})
+        with self.state.lock:
+            items = self.state.query(endpoint, query)
+        self._page_netbox(path, items, query)
+
+    def _netbox_write(self, segments):
+        state = self.state
+        endpoint, object_id = self._netbox_target(segments)
+        body = self._body()
+        many = isinstance(body, list)
+        items = body if many else [body or {}]
+        if object_id is not None:
+            items = [dict(items[0], id=object_id)]
+
+        with state.lock:
+            table = state.table(endpoint)
+            if self.command == "DELETE":
+                ids = [item["id"] for item in items]
+                missing = [i for i in ids if i not in table]
+                if missing:
+                    return self._send(404, {"detail": f"Objetos não encontrados: {missing}"})
+                for i in ids:
+                    del table[i]
+                state.cascade_delete(endpoint, ids)
+                return self._send(204)
+
+            # Valida o lote inteiro antes de gravar: operações em lote do NetBox são atômicas
+            errors, pending = [], []
+            names = {obj.get("name"): obj["id"] for obj in table.values()}
+            for item in items:
+                existing = table.get(item.get("id")) if self.command == "PATCH" else None
+                if self.command == "PATCH" and existing is None:
+                    errors.append({"id": ["Objeto não encontrado."]})
+                    continue
+                error = state.validate(endpoint, item, names, existing and existing["id"])
+                if error is None and item.get("name") is not None:
+                    names[item["name"]] = existing["id"] if existing else -len(pending) - 1
+                errors.append(error or {})
+                pending.append((existing, item))
+            if any(errors):
+                return self._send(400, errors if many else errors[0])
+
+            results = []
+            for existing, item in pending:
+                if existing is None:
+                    item = dict(item, id=state.next_id)
+                    state.next_id += 1
+                obj = state.store(endpoint, item, existing)
+                table[obj["id"]] = obj
+                results.append(obj)
+        self._send(201 if self.command == "POST" else 200, results if many else results[0])
+
+    # --- despacho ---
+
+    def do_GET(self):
+        path, query, segments = self._route()
+        if segments[:2] == ["api", "v2"]:
+            return self._awx_get(path, query, segments)
+        if segments == ["stats"]:
+            return self._send(200, self.state.stats())
+        self._netbox_get(path, query, segments)
+
+    def _write(self):
+        path, query, segments = self._route()
+        if segments[:2] == ["api", "v2"]:
+            return self._awx_post(segments)
+        if segments == ["graphql"]:
+            with self.state.lock:
+                return self._send(200, self.state.graphql(self._body() or {}))
+        try:
+            self._netbox_write(segments)
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {"detail": str(e)})
+
+    do_POST = do_PATCH = do_DELETE = _write
+
+
+def make_server(host_count, port=0, latency_ms=0, facts_kb=4, seed=42, vcenters=1):
+    """Cria o servidor (ainda não iniciado) com um inventário sintético de `host_count` VMs."""
+    state = FakeState(generate_inventory(host_count, facts_kb, seed, vcenters), latency_ms)
+    handler = type("BoundFakeHandler", (FakeHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita as APIs do AWX e do NetBox.")
+    parser.add_argument("--hosts", type=int, default=1000, help="quantidade de VMs no inventário sintético")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0, help="latência adicionada a cada requisição")
+    parser.add_argument("--facts-kb", type=int, default=4, help="tamanho aproximado das variáveis de cada host")
+    parser.add_argument("--vcenters", type=int, default=1, help="número de inventários/datacenters/clusters")
+    args = parser.parse_args()
+
+    server = make_server(args.hosts, args.port, args.latency_ms, args.facts_kb, vcenters=args.vcenters)
+    print(f"🚀 Servidor fake em http://127.0.0.1:{server.server_address[1]} ({args.hosts} hosts)")
+    print("   Use AWX_URL e NETBOX_URL apontando para este endereço; estatísticas em /stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de escala da sincronização AWX -> NetBox, sem acesso à rede.
+
+Para cada tamanho de inventário sobe o servidor fake (benchmarks/fake_server.py) e executa:
+- sync-initial: awx-netbox.py contra um NetBox vazio (carga inicial);
+- sync-steady:  awx-netbox.py novamente, sem mudanças (execução recorrente);
+- collector:    awx_collector.py sobre o mesmo inventário.
+
+Para cada fase mede tempo de parede, requisições atendidas pelo servidor e pico de RSS do processo
+(VmHWM, Linux). As fases da sincronização vêm dos spans do relatório JSON (SYNC_REPORT_PATH), qualquer
+que seja o formato do log; as do coletor, das linhas da saída. Variáveis SYNC_* do ambiente são
+repassadas aos scripts, permitindo comparar configurações.
+
+Uso: python3 benchmarks/run_benchmark.py --sizes 1000,10000,50000 --latency-ms 2 --output bench.json
+"""
+
+import argparse
+import bisect
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_server import make_server  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYNC_SCRIPT = os.path.join(REPO_ROOT, "scripts", "awx-netbox.py")
+COLLECTOR_SCRIPT = os.path.join(REPO_ROOT, "scripts", "awx_collector.py")
+
+
+def _peak_rss_kb(pid):
+    """Pico de memória residente (VmHWM) do processo, em KB; None se indisponível."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+# Intervalo de amostragem de requisições e RSS, usado para atribuir os contadores aos spans do relatório
+SAMPLE_INTERVAL = 0.05
+
+
+def _sample_at(samples, timestamp):
+    """Última amostra (epoch, requisições, bytes, RSS KB) tomada até `timestamp`."""
+    index = bisect.bisect_right([sample[0] for sample in samples], timestamp)
+    return samples[max(index - 1, 0)]
+
+
+def _phases_from_report(report, samples):
+    """Fases a partir dos spans do relatório da sincronização, com os contadores das amostras."""
+    base = datetime.fromisoformat(report["started_at"]).timestamp()
+    phases = []
+    for span in report["phases"]:
+        start = base + span["start_offset"]
+        first, last = _sample_at(samples, start), _sample_at(samples, start + span["seconds"])
+        phases.append({
+            "phase": span["title"][:60],
+            "seconds": span["seconds"],
+            "requests": last[1] - first[1],
+            "bytes_sent": last[2] - first[2],
+            "peak_rss_mb": round((last[3] or 0) / 1024, 1),
+        })
+    return phases
+
+
+def _is_phase_marker(line):
+    text = line.strip()
+    return text.startswith("FASE") or text.startswith("- Etapa") or text.startswith("🖥️ Buscando hosts")
+
+
+def run_script(server, script, args=(), cwd=None, env_overrides=None, report_path=None):
+    """Executa um script contra o servidor fake e mede cada fase.
+
+    Com `report_path` (awx-netbox.py) as fases vêm do relatório JSON gravado pelo script;
+    sem ele, ou se o relatório não for gravado, das linhas 'FASE'/'Etapa' da saída.
+    """
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    env = dict(os.environ)
+    env.update({
+        "AWX_URL": url, "AWX_USER": "bench", "AWX_PASSWORD": "bench",
+        "NETBOX_URL": url, "NETBOX_TOKEN": "bench", "PYTHONUNBUFFERED": "1",
+    })
+    env.update(env_overrides or {})
+    if report_path:
+        env["SYNC_REPORT_PATH"] = report_path
+
+    server.state.reset_counters()
+    started = time.monotonic()
+    samples = [(time.time(), 0, 0, 0)]
+    process = subprocess.Popen([sys.executable, script, *args], cwd=cwd, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+    finished = threading.Event()
+
+    def sample():
+        while not finished.wait(SAMPLE_INTERVAL):
+            stats = server.state.stats()
+            rss = _peak_rss_kb(process.pid) or samples[-1][3]
+            samples.append((time.time(), stats["requests"], stats["bytes_sent"], rss))
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    phases = []
+    current = {"name": "início", "start": started, "requests": 0, "bytes": 0}
+    output_tail = []
+
+    def close_phase(now):
+        stats = server.state.stats()
+        phases.append({
+            "phase": current["name"],
+            "seconds": round(now - current["start"], 3),
+            "requests": stats["requests"] - current["requests"],
+            "bytes_sent": stats["bytes_sent"] - current["bytes"],
+            "peak_rss_mb": round((_peak_rss_kb(process.pid) or 0) / 1024, 1),
+        })
+        return stats
+
+    for line in process.stdout:
+        output_tail = (output_tail + [line.rstrip()])[-20:]
+        if _is_phase_marker(line):
+            now = time.monotonic()
+            stats = close_phase(now)
+            current = {"name": line.strip()[:60], "start": now, "requests": stats["requests"], "bytes": stats["bytes_sent"]}
+
+    # O pico final vem do rusage do filho (ru_maxrss em KB no Linux)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    finished.set()
+    sampler.join()
+    now = time.monotonic()
+    close_phase(now)
+    phases[-1]["peak_rss_mb"] = round(usage.ru_maxrss / 1024, 1)
+    stats = server.state.stats()
+    samples.append((time.time(), stats["requests"], stats["bytes_sent"], usage.ru_maxrss))
+
+    if report_path and os.path.exists(report_path):
+        with open(report_path, encoding="utf-8") as f:
+            phases = _phases_from_report(json.load(f), samples)
+
+    return {
+        "returncode": process.returncode,
+        "seconds": round(now - started, 3),
+        "requests": stats["requests"],
+        "bytes_sent": stats["bytes_sent"],
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "phases": [phase for phase in phases if phase["seconds"] or phase["requests"]],
+        "requests_by_endpoint": stats["by_endpoint"],
+        "output_tail": output_tail if process.returncode else [],
+    }
+
+
+def print_result(size, scenario, result):
+    status = "ok" if result["returncode"] == 0 else f"FALHOU (rc={result['returncode']})"
+    print(f"\n=== {size} VMs | {scenario} | {status} | {result['seconds']:.2f}s | "
+          f"{result['requests']} req | pico RSS {result['peak_rss_mb']} MB ===")
+    print(f"   {'fase':<62}{'tempo (s)':>10}{'req':>8}{'MB resp.':>10}{'RSS MB':>9}")
+    for phase in result["phases"]:
+        print(f"   {phase['phase']:<62}{phase['seconds']:>10.2f}{phase['requests']:>8}"
+              f"{phase['bytes_sent'] / 1_048_576:>10.1f}{phase['peak_rss_mb']:>9}")
+    for line in result["output_tail"]:
+        print(f"   | {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escala da sincronização AWX -> NetBox.")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="tamanhos de inventário, separados por vírgula")
+    parser.add_argument("--scenarios", default="sync,collector", help="sync e/ou collector")
+    parser.add_argument("--latency-ms", type=float, default=0, help="latência adicionada a cada requisição")
+    parser.add_argument("--facts-kb", type=int, default=4, help="tamanho aproximado das variáveis de cada host")
+    parser.add_argument("--output", help="grava os resultados completos em JSON")
+    args = parser.parse_args()
+
+    scenarios = {name.strip() for name in args.scenarios.split(",")}
+    results = []
+    for size in (int(value) for value in args.sizes.split(",")):
+        print(f"\n🧪 Gerando inventário sintético com {size} VMs...")
+        server = make_server(size, latency_ms=args.latency_ms, facts_kb=args.facts_kb)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            with tempfile.TemporaryDirectory() as workdir:
+                runs = []
+                if "sync" in scenarios:
+                    runs += [("sync-initial", SYNC_SCRIPT), ("sync-steady", SYNC_SCRIPT)]
+                if "collector" in scenarios:
+                    runs.append(("collector", COLLECTOR_SCRIPT))
+                for scenario, script in runs:
+                    report_path = os.path.join(workdir, f"{scenario}.report.json") if script == SYNC_SCRIPT else None
+                    result = run_script(server, script, cwd=workdir, report_path=report_path)
+                    print_result(size, scenario, result)
+                    results.append({"size": size, "scenario": scenario, **result})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados salvos em: {args.output}")
+
+    if any(result["returncode"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
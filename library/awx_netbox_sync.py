@@ -0,0 +1,217 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Módulo Ansible awx_netbox_sync: executa scripts/awx-netbox.py em uma única tarefa.
+
+Substitui as chamadas uri/set_fact por host do playbook: a coleta paginada do AWX e as
+escritas em lote no NetBox acontecem dentro do script, e o relatório JSON da execução
+volta como resultado estruturado da tarefa.
+"""
+
+DOCUMENTATION = r"""
+---
+module: awx_netbox_sync
+short_description: Sincroniza as VMs dos inventários do AWX com o NetBox
+description:
+  - Executa o motor de sincronização C(scripts/awx-netbox.py) do projeto e retorna o relatório da execução.
+  - Com O(sync_to_netbox=false) apenas coleta os hosts do AWX, sem acessar o NetBox.
+  - Com O(dry_run=true) (ou em check mode) calcula o plano de alterações (subcomando C(plan)), só com leituras,
+    e o grava em O(changeset); com O(dry_run=false) e O(changeset) informado, aplica esse plano (subcomando C(apply)).
+options:
+  inventory_filter:
+    description: Nomes dos inventários do AWX separados por vírgula, ou C(all).
+    type: str
+    default: VMware Inventory
+  host_filter:
+    description: Trecho do nome dos hosts a sincronizar (sem diferenciar maiúsculas); vazio sincroniza todos.
+    type: str
+    default: ""
+  sync_to_netbox:
+    description: Sincroniza com o NetBox; quando falso, apenas coleta do AWX.
+    type: bool
+    default: false
+  dry_run:
+    description: Apenas calcula o plano de alterações, sem escrever no NetBox, mesmo com O(sync_to_netbox=true).
+    type: bool
+    default: true
+  changeset:
+    description:
+      - Arquivo do plano de alterações, relativo a O(project_path).
+      - Com O(dry_run=true) o plano é gravado nele; com O(dry_run=false) o plano é aplicado no lugar de uma sincronização completa.
+    type: path
+  awx_url:
+    description: URL do AWX.
+    type: str
+    required: true
+  awx_username:
+    description: Usuário do AWX.
+    type: str
+    required: true
+  awx_password:
+    description: Senha do AWX.
+    type: str
+    required: true
+  netbox_url:
+    description: URL do NetBox (obrigatória para escrever no NetBox).
+    type: str
+  netbox_token:
+    description: Token da API do NetBox (obrigatório para escrever no NetBox).
+    type: str
+  project_path:
+    description: Diretório do projeto, onde está C(scripts/awx-netbox.py).
+    type: path
+    default: /runner/project
+  sync_options:
+    description: Variáveis C(SYNC_*) adicionais repassadas ao script (ex. C(SYNC_SHARD_BY)).
+    type: dict
+    default: {}
+"""
+
+EXAMPLES = r"""
+- name: Calcular o plano de alterações para aprovação
+  awx_netbox_sync:
+    awx_url: "{{ awx_url }}"
+    awx_username: "{{ lookup('env', 'AWX_USERNAME') }}"
+    awx_password: "{{ lookup('env', 'AWX_PASSWORD') }}"
+    netbox_url: "{{ lookup('env', 'NETBOX_API') }}"
+    netbox_token: "{{ lookup('env', 'NETBOX_TOKEN') }}"
+    sync_to_netbox: true
+    dry_run: true
+    changeset: /var/lib/awx-netbox/changeset.jsonl
+
+- name: Aplicar o plano aprovado na janela de escrita
+  awx_netbox_sync:
+    awx_url: "{{ awx_url }}"
+    awx_username: "{{ lookup('env', 'AWX_USERNAME') }}"
+    awx_password: "{{ lookup('env', 'AWX_PASSWORD') }}"
+    netbox_url: "{{ lookup('env', 'NETBOX_API') }}"
+    netbox_token: "{{ lookup('env', 'NETBOX_TOKEN') }}"
+    sync_to_netbox: true
+    dry_run: false
+    changeset: /var/lib/awx-netbox/changeset.jsonl
+
+- name: Sincronizar o inventário VMware com o NetBox
+  awx_netbox_sync:
+    awx_url: "{{ awx_url }}"
+    awx_username: "{{ lookup('env', 'AWX_USERNAME') }}"
+    awx_password: "{{ lookup('env', 'AWX_PASSWORD') }}"
+    netbox_url: "{{ lookup('env', 'NETBOX_API') }}"
+    netbox_token: "{{ lookup('env', 'NETBOX_TOKEN') }}"
+    inventory_filter: VMware Inventory
+    sync_to_netbox: true
+    dry_run: false
+    project_path: "{{ playbook_dir }}/.."
+  register: sync_result
+"""
+
+RETURN = r"""
+command:
+  description: Subcomando executado (C(sync), C(plan), C(apply) ou C(collect)).
+  type: str
+  returned: always
+changeset:
+  description: Arquivo do plano de alterações gravado (C(plan)) ou aplicado (C(apply)).
+  type: str
+  returned: when command is plan or apply
+summary:
+  description: Contadores da execução (VMs criadas, atualizadas, sem alteração, interfaces, IPs, rejeitados); no C(plan), as alterações planejadas.
+  type: dict
+  returned: always
+report:
+  description: Relatório completo (fases, requisições por endpoint, novas tentativas e lotes).
+  type: dict
+  returned: always
+log_tail:
+  description: Últimas linhas da saída do script.
+  type: list
+  returned: always
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+from ansible.module_utils.basic import AnsibleModule, env_fallback
+
+# Linhas finais da saída do script devolvidas no resultado da tarefa
+LOG_TAIL_LINES = 200
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            inventory_filter=dict(type="str", default="VMware Inventory"),
+            host_filter=dict(type="str", default=""),
+            sync_to_netbox=dict(type="bool", default=False),
+            dry_run=dict(type="bool", default=True),
+            awx_url=dict(type="str", required=True, fallback=(env_fallback, ["AWX_URL"])),
+            awx_username=dict(type="str", required=True, fallback=(env_fallback, ["AWX_USERNAME", "AWX_USER"])),
+            awx_password=dict(type="str", required=True, no_log=True, fallback=(env_fallback, ["AWX_PASSWORD"])),
+            netbox_url=dict(type="str", fallback=(env_fallback, ["NETBOX_API", "NETBOX_URL"])),
+            netbox_token=dict(type="str", no_log=True, fallback=(env_fallback, ["NETBOX_TOKEN"])),
+            project_path=dict(type="path", default="/runner/project"),
+            changeset=dict(type="path"),
+            sync_options=dict(type="dict", default={}),
+        ),
+        supports_check_mode=True,
+    )
+    params = module.params
+    if not params["sync_to_netbox"]:
+        command = "collect"
+    elif params["dry_run"] or module.check_mode:
+        command = "plan"
+    else:
+        command = "apply" if params["changeset"] else "sync"
+    if command != "collect" and not (params["netbox_url"] and params["netbox_token"]):
+        module.fail_json(msg="netbox_url e netbox_token são obrigatórios para sincronizar com o NetBox.")
+    changeset = os.path.join(params["project_path"], params["changeset"] or "netbox_changeset.jsonl")
+    if command == "apply" and not os.path.exists(changeset):
+        module.fail_json(msg=f"Plano de alterações não encontrado: {changeset}")
+
+    script = os.path.join(params["project_path"], "scripts", "awx-netbox.py")
+    if not os.path.exists(script):
+        module.fail_json(msg=f"Script de sincronização não encontrado: {script}")
+
+    report_fd, report_path = tempfile.mkstemp(prefix="awx_netbox_sync_", suffix=".json")
+    os.close(report_fd)
+    environ = {
+        "AWX_URL": params["awx_url"], "AWX_USER": params["awx_username"], "AWX_PASSWORD": params["awx_password"],
+        "NETBOX_URL": params["netbox_url"] or "", "NETBOX_TOKEN": params["netbox_token"] or "",
+        "SYNC_AWX_INVENTORIES": params["inventory_filter"], "SYNC_HOST_FILTER": params["host_filter"],
+        "SYNC_REPORT_PATH": report_path, "SYNC_CHANGESET_PATH": changeset, "PYTHONUNBUFFERED": "1",
+        **{key: str(value) for key, value in params["sync_options"].items()},
+    }
+
+    try:
+        rc, stdout, stderr = module.run_command([sys.executable, "-u", script, command] + ([changeset] if command == "apply" else []),
+                                                cwd=params["project_path"], environ_update=environ)
+        report = {}
+        if os.path.getsize(report_path):
+            with open(report_path, encoding="utf-8") as f:
+                report = json.load(f)
+    finally:
+        os.remove(report_path)
+
+    summary = report.get("summary", {})
+    # O plano não escreve no NetBox: só 'sync' e 'apply' alteram o estado
+    writes = command in ("sync", "apply")
+    result = dict(
+        command=command,
+        summary=summary,
+        report=report,
+        log_tail=stdout.splitlines()[-LOG_TAIL_LINES:],
+        changed=writes and any(summary.get(key) for key in ("vms_created", "vms_updated", "interfaces_created",
+                                                            "ips_created", "ips_reassigned", "ips_deleted",
+                                                            "primary_ips_updated", "vms_pruned", "objects_sent")),
+    )
+    if command in ("plan", "apply"):
+        result["changeset"] = changeset
+    if report.get("status") == "partial":
+        module.warn("Alguns lotes foram rejeitados pelo NetBox; veja o arquivo de rejeitos do projeto.")
+    if rc != 0:
+        module.fail_json(msg=f"Sincronização falhou com código de retorno {rc}", rc=rc, stderr=stderr, **result)
+    module.exit_json(**result)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,155 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import traceback
+import argparse
+import atexit
+import hmac
+import ipaddress
 import requests
 import json
+import logging
+import logging.handlers
+import multiprocessing
 import os
+import queue
+import random
+import signal
+import sqlite3
 import sys
-from datetime import datetime
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
 from urllib3.exceptions import InsecureRequestWarning
+from http_cache import CACHE_HEADER, CachingAdapter, ResponseCache
 
 # --- CONFIGURAÇÃO INICIAL ---
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
-def print_flush(msg):
-    print(msg, flush=True)
-    sys.stdout.flush()
+# --- REGISTRO (LOGGING) ---
+
+# Nível mínimo (DEBUG inclui cada lote enviado), níveis por logger (JSON, ex.: {"write": "DEBUG"}),
+# formato (text = mensagens como no console; json = um objeto por linha com horário, nível, logger,
+# fase e partição) e destino (vazio = stdout)
+LOG_LEVEL = os.getenv("SYNC_LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = json.loads(os.getenv("SYNC_LOG_LEVELS", "{}"))
+LOG_FORMAT = os.getenv("SYNC_LOG_FORMAT", "text").lower()
+LOG_FILE = os.getenv("SYNC_LOG_FILE", "")
+
+# Falhas de lote: caracteres do erro/payload exibidos no log, falhas detalhadas por minuto (as demais
+# só são contadas; 0 = sem limite) e arquivo JSON Lines com o registro completo de cada falha (vazio = desativado)
+LOG_PAYLOAD_CHARS = int(os.getenv("SYNC_LOG_PAYLOAD_CHARS", "500"))
+LOG_FAILURES_PER_MINUTE = int(os.getenv("SYNC_LOG_FAILURES_PER_MINUTE", "10"))
+ERROR_DUMP_PATH = os.getenv("SYNC_ERROR_DUMP_PATH", "netbox_errors.jsonl")
+
+# Fase e partição correntes, anexadas a cada registro
+_log_context = {"phase": None, "shard": None}
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.phase = _log_context["phase"]
+        record.shard = _log_context["shard"]
+        return True
+
+class TextFormatter(logging.Formatter):
+    """A mensagem como era impressa no console, com o prefixo da partição em cada linha."""
+
+    def format(self, record):
+        msg = super().format(record)
+        if record.shard:
+            msg = "\n".join(f"[{record.shard}] {line}" if line else line for line in msg.split("\n"))
+        return msg
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por registro; campos passados em extra={'fields': {...}} entram no objeto."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname, "logger": record.name, "phase": record.phase, "shard": record.shard,
+            "message": record.getMessage().strip(), **(getattr(record, "fields", None) or {}),
+        }
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class LogWriter(threading.Thread):
+    """Grava em segundo plano os registros enfileirados pelas threads da sincronização.
+
+    Cada rodada esvazia a fila e faz uma única escrita (e um flush) com todas as linhas
+    acumuladas, em vez de um flush por linha.
+    """
+
+    def __init__(self, stream, formatter):
+        super().__init__(name="log-writer", daemon=True)
+        self.stream = stream
+        self.formatter = formatter
+        self.queue = queue.Queue()
+
+    def run(self):
+        while True:
+            records = [self.queue.get()]
+            while True:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [self.formatter.format(record) for record in records if record is not None]
+            try:
+                if lines:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+            except (OSError, ValueError):
+                pass  # Destino fechado (ex.: pipe encerrado): os registros são descartados
+            for _ in records:
+                self.queue.task_done()
+            if any(record is None for record in records):
+                return
+
+    def flush(self):
+        """Aguarda a gravação de tudo o que já foi enfileirado."""
+        self.queue.join()
+
+    def stop(self):
+        self.queue.put(None)
+        self.join(timeout=10)
+
+def setup_logging():
+    """Direciona o logger 'awx_netbox' (e os filhos) para a fila de uma LogWriter."""
+    stream = open(LOG_FILE, "a", encoding="utf-8") if LOG_FILE else sys.stdout
+    writer = LogWriter(stream, JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    handler = logging.handlers.QueueHandler(writer.queue)
+    handler.addFilter(_ContextFilter())
+    logger = logging.getLogger("awx_netbox")
+    logger.handlers[:] = [handler]
+    logger.propagate = False
+    logger.setLevel(LOG_LEVEL if isinstance(logging.getLevelName(LOG_LEVEL), int) else "INFO")
+    for name, level in LOG_LEVELS.items():
+        logging.getLogger(f"awx_netbox.{name}").setLevel(level.upper())
+    writer.start()
+    atexit.register(writer.stop)
+    return writer
+
+_log_writer = setup_logging()
+log = logging.getLogger("awx_netbox")
+
+# Loggers por fase: coleta do AWX, carga do estado do NetBox, escritas em lote, plano, poda,
+# partições, daemon e transporte HTTP
+log_awx = logging.getLogger("awx_netbox.awx")
+log_state = logging.getLogger("awx_netbox.state")
+log_write = logging.getLogger("awx_netbox.write")
+log_plan = logging.getLogger("awx_netbox.plan")
+log_prune = logging.getLogger("awx_netbox.prune")
+log_shard = logging.getLogger("awx_netbox.shard")
+log_daemon = logging.getLogger("awx_netbox.daemon")
+log_http = logging.getLogger("awx_netbox.http")
+
+if not isinstance(logging.getLevelName(LOG_LEVEL), int) or LOG_FORMAT not in ("text", "json"):
+    log.critical(f"ERRO CRÍTICO: SYNC_LOG_LEVEL ({LOG_LEVEL}) ou SYNC_LOG_FORMAT ({LOG_FORMAT}) inválido")
+    sys.exit(1)
+
+# --- CONFIGURAÇÃO DAS APIS ---
 
 # Carrega e valida variáveis de ambiente
 AWX_URL = os.getenv("AWX_URL")
@@ -22,21 +158,465 @@ AWX_PASSWORD = os.getenv("AWX_PASSWORD")
 NETBOX_URL = os.getenv("NETBOX_URL") or os.getenv("NETBOX_API")
 NETBOX_TOKEN = os.getenv("NETBOX_TOKEN")
 
-for var in ["AWX_URL", "AWX_USER", "AWX_PASSWORD", "NETBOX_URL", "NETBOX_TOKEN"]:
+# O subcomando 'collect' só lê o AWX e dispensa as variáveis do NetBox;
+# 'apply' executa um plano já calculado e dispensa as variáveis do AWX
+REQUIRED_VARS = (([] if sys.argv[1:2] == ["apply"] else ["AWX_URL", "AWX_USER", "AWX_PASSWORD"])
+                 + ([] if sys.argv[1:2] == ["collect"] else ["NETBOX_URL", "NETBOX_TOKEN"]))
+for var in REQUIRED_VARS:
     if not locals().get(var):
-        print_flush(f"ERRO CRÍTICO: Variável de ambiente obrigatória não definida: {var}")
+        log.critical(f"ERRO CRÍTICO: Variável de ambiente obrigatória não definida: {var}")
         sys.exit(1)
 
-# Mapeamentos
-DATACENTER_TO_SITE_MAP = {"ATI-SLC-HCI": "ETIPI - Prédio Sede"}
-CLUSTER_MAP = {"Cluster vSAN": "Cluster vSAN"}
+# Mapeamentos (estendidos por objetos JSON em SYNC_DATACENTER_SITE_MAP e SYNC_CLUSTER_MAP)
+DATACENTER_TO_SITE_MAP = {"ATI-SLC-HCI": "ETIPI - Prédio Sede", **json.loads(os.getenv("SYNC_DATACENTER_SITE_MAP", "{}"))}
+CLUSTER_MAP = {"Cluster vSAN": "Cluster vSAN", **json.loads(os.getenv("SYNC_CLUSTER_MAP", "{}"))}
+
+# Inventários do AWX sincronizados (nomes separados por vírgula, ou 'all') e filtro opcional
+# pelo nome do host (trecho do nome, sem diferenciar maiúsculas; aplicado pela API do AWX)
+AWX_INVENTORIES = [name.strip() for name in os.getenv("SYNC_AWX_INVENTORIES", "VMware Inventory").split(",") if name.strip()]
+HOST_FILTER = os.getenv("SYNC_HOST_FILTER", "")
+
+# Execução particionada: critério de partição (inventory | datacenter | cluster; vazio = desativada)
+# e número de processos que sincronizam as partições em paralelo
+SHARD_BY = os.getenv("SYNC_SHARD_BY", "").lower()
+SHARD_WORKERS = max(1, int(os.getenv("SYNC_SHARD_WORKERS", "4")))
+if SHARD_BY not in ("", "inventory", "datacenter", "cluster"):
+    log.critical(f"ERRO CRÍTICO: SYNC_SHARD_BY inválido: {SHARD_BY} (use inventory, datacenter ou cluster)")
+    sys.exit(1)
+
+# VMs que saíram do AWX (só as gerenciadas pela sincronização, nos clusters sincronizados):
+# none = mantém (padrão), offline = marca como offline, delete = remove a VM e seus IPs.
+# Só é aplicado após uma coleta completa do AWX (sem checkpoint incremental nem filtro de host)
+PRUNE_MODE = os.getenv("SYNC_PRUNE", "none").lower()
+if PRUNE_MODE not in ("none", "offline", "delete"):
+    log.critical(f"ERRO CRÍTICO: SYNC_PRUNE inválido: {PRUNE_MODE} (use none, offline ou delete)")
+    sys.exit(1)
+# IPs da eth0 das VMs sincronizadas que o AWX deixou de reportar: mantidos por padrão (true = remove)
+PRUNE_IPS = os.getenv("SYNC_PRUNE_IPS", "false").lower() in ("1", "true", "yes")
+
+# Paginação: tamanho da página e número de páginas buscadas em paralelo (1 = sequencial)
+PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+PAGE_WORKERS = max(1, int(os.getenv("SYNC_PAGE_WORKERS", "8")))
+
+# Escrita em lote: tamanho inicial/mínimo/máximo do lote adaptativo, latência alvo por lote,
+# lotes simultâneos por chamada e modo streaming (leituras do AWX sobrepostas às escritas no NetBox)
+BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "50"))
+BATCH_SIZE_MIN = int(os.getenv("SYNC_BATCH_SIZE_MIN", "5"))
+BATCH_SIZE_MAX = int(os.getenv("SYNC_BATCH_SIZE_MAX", "500"))
+BATCH_TARGET_SECONDS = float(os.getenv("SYNC_BATCH_TARGET_SECONDS", "10"))
+WRITE_WORKERS = max(1, int(os.getenv("SYNC_WRITE_WORKERS", "4")))
+STREAMING = os.getenv("SYNC_STREAMING", "false").lower() in ("1", "true", "yes")
+
+# Arquivo JSON Lines com os objetos rejeitados pelo NetBox (reprocessável com 'replay-rejects')
+REJECTS_PATH = os.getenv("SYNC_REJECTS_PATH", "netbox_rejects.jsonl")
+
+# Modo daemon: intervalo entre consultas a /api/v2/inventory_updates/ e receptor opcional de
+# webhook do AWX (porta 0 = desativado; com token, exige 'Authorization: Bearer <token>')
+DAEMON_POLL_SECONDS = float(os.getenv("SYNC_DAEMON_POLL_SECONDS", "60"))
+DAEMON_WEBHOOK_ADDRESS = os.getenv("SYNC_DAEMON_WEBHOOK_ADDRESS", "0.0.0.0")
+DAEMON_WEBHOOK_PORT = int(os.getenv("SYNC_DAEMON_WEBHOOK_PORT", "0"))
+DAEMON_WEBHOOK_TOKEN = os.getenv("SYNC_DAEMON_WEBHOOK_TOKEN", "")
+
+# Plano de alterações: arquivo JSON Lines gravado por 'plan' (só leituras) e executado por 'apply'
+CHANGESET_PATH = os.getenv("SYNC_CHANGESET_PATH", "netbox_changeset.jsonl")
+
+# Transporte HTTP: novas tentativas (backoff exponencial com jitter, em segundos; HTTP_BACKOFF_MAX
+# também limita a espera pedida pelo Retry-After) e limite de requisições por segundo por host
+# (0 = sem limite), com rajada máxima
+HTTP_RETRIES = int(os.getenv("SYNC_HTTP_RETRIES", "5"))
+HTTP_BACKOFF = float(os.getenv("SYNC_HTTP_BACKOFF", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("SYNC_HTTP_BACKOFF_MAX", "60"))
+RATE_LIMIT = float(os.getenv("SYNC_RATE_LIMIT", "0"))
+RATE_BURST = int(os.getenv("SYNC_RATE_BURST", "20"))
+
+# Cache de respostas GET (scripts/http_cache.py), em memória e, com SYNC_HTTP_CACHE_PATH, em disco (SQLite).
+# TTL em segundos por endpoint (prefixo), estendido por SYNC_HTTP_CACHE_POLICIES (JSON): dentro do TTL a
+# resposta é servida localmente; com 0 só é revalidada (ETag/Last-Modified); negativo desativa o cache
+HTTP_CACHE = os.getenv("SYNC_HTTP_CACHE", "false").lower() in ("1", "true", "yes")
+HTTP_CACHE_PATH = os.getenv("SYNC_HTTP_CACHE_PATH", "")
+HTTP_CACHE_MEMORY_MB = float(os.getenv("SYNC_HTTP_CACHE_MEMORY_MB", "128"))
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("SYNC_HTTP_CACHE_MAX_ENTRIES", "10000"))
+HTTP_CACHE_POLICIES = {
+    # Referências que raramente mudam: servidas localmente por até 1 hora
+    "dcim/sites": 3600, "virtualization/cluster-types": 3600, "virtualization/clusters": 3600,
+    "dcim/device-roles": 3600, "tenancy/tenants": 3600, "extras/tags": 3600,
+    **json.loads(os.getenv("SYNC_HTTP_CACHE_POLICIES", "{}")),
+}
+
+# Carga do estado do NetBox (VMs, interfaces, IPs e tags): rest = endpoints paginados;
+# graphql = uma consulta GraphQL projetada e paginada (NetBox 4.x), com a API REST como fallback
+STATE_BACKEND = os.getenv("SYNC_STATE_BACKEND", "rest").lower()
+if STATE_BACKEND not in ("rest", "graphql"):
+    log.critical(f"ERRO CRÍTICO: SYNC_STATE_BACKEND inválido: {STATE_BACKEND} (use rest ou graphql)")
+    sys.exit(1)
+
+# Leitura de interfaces/IPs restrita às VMs sincronizadas: valores por filtro em cada consulta
+SCOPED_READS = os.getenv("SYNC_SCOPED_READS", "true").lower() in ("1", "true", "yes")
+FILTER_CHUNK_SIZE = int(os.getenv("SYNC_FILTER_CHUNK_SIZE", "100"))
+
+# Snapshot local do NetBox (vazio = desativado) e intervalo entre verificações completas
+SNAPSHOT_PATH = os.getenv("SYNC_SNAPSHOT_PATH", "")
+SNAPSHOT_FULL_INTERVAL = timedelta(hours=float(os.getenv("SYNC_SNAPSHOT_FULL_INTERVAL_HOURS", "24")))
+
+# Checkpoint da coleta incremental do AWX (vazio = sempre coleta completa) e intervalo da varredura completa
+AWX_CHECKPOINT_PATH = os.getenv("SYNC_AWX_CHECKPOINT_PATH", "")
+AWX_FULL_INTERVAL = timedelta(hours=float(os.getenv("SYNC_AWX_FULL_INTERVAL_HOURS", "24")))
+
+# Relatório da execução: JSON e métricas para o textfile collector do node exporter (vazio = desativado)
+REPORT_PATH = os.getenv("SYNC_REPORT_PATH", "")
+METRICS_PATH = os.getenv("SYNC_METRICS_PATH", "")
+METRICS_FORMAT = os.getenv("SYNC_METRICS_FORMAT", "prometheus").lower()  # prometheus | openmetrics
+
+# --- MÉTRICAS E RELATÓRIO DE EXECUÇÃO ---
+
+# Limites (em segundos) dos buckets do histograma de latência HTTP
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 180)
+
+METRIC_PREFIX = "awx_netbox_sync"
+
+def _endpoint_label(url):
+    """Normaliza a URL para rótulo de métrica: sem '/api/', query e IDs numéricos."""
+    path = urlsplit(url).path
+    if path.startswith("/api/"):
+        path = path[len("/api/"):]
+    return "/".join("{id}" if part.isdigit() else part for part in path.strip("/").split("/"))
+
+class RunMetrics:
+    """Coleta spans das FASES/Etapas, requisições HTTP, novas tentativas e resultado dos lotes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.monotonic()
+        self.phases = []
+        self._open = {}
+        self.http = {}
+        self.retries = {}
+        self.batches = {}
+        self.cache = {}
+        self.summary = {}
+
+    def mark_phase(self, title):
+        """Abre o span de uma FASE (nível 0) ou Etapa (nível 1), fechando os spans abertos de mesmo nível ou inferiores."""
+        level = 1 if title.startswith("- Etapa") else 0
+        name = title.lstrip("- ").split(":")[0]
+        now = time.monotonic()
+        with self._lock:
+            for open_level in sorted(self._open, reverse=True):
+                if open_level >= level:
+                    self._close(open_level, now)
+            span = {"name": name, "title": title, "level": level, "start_offset": round(now - self._started, 3)}
+            self._open[level] = (span, now)
+            self.phases.append(span)
+
+    def _close(self, level, now):
+        span, started = self._open.pop(level)
+        span["seconds"] = round(now - started, 3)
+
+    def record_request(self, service, method, url, status, elapsed, sent_bytes, received_bytes):
+        key = (service, method, _endpoint_label(url))
+        with self._lock:
+            entry = self.http.setdefault(key, {
+                "count": 0, "errors": 0, "seconds": 0.0, "sent_bytes": 0, "received_bytes": 0,
+                "statuses": {}, "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+            })
+            entry["count"] += 1
+            entry["errors"] += status is None or status >= 400
+            entry["seconds"] += elapsed
+            entry["sent_bytes"] += sent_bytes
+            entry["received_bytes"] += received_bytes
+            status_key = str(status or "erro")
+            entry["statuses"][status_key] = entry["statuses"].get(status_key, 0) + 1
+            bucket = next((i for i, limit in enumerate(LATENCY_BUCKETS) if elapsed <= limit), len(LATENCY_BUCKETS))
+            entry["buckets"][bucket] += 1
+
+    def record_retry(self, service):
+        with self._lock:
+            self.retries[service] = self.retries.get(service, 0) + 1
+
+    def record_cache(self, service, outcome):
+        """Resposta GET atendida pelo cache HTTP: 'hit', 'revalidated' ou 'miss'."""
+        with self._lock:
+            self.cache[(service, outcome)] = self.cache.get((service, outcome), 0) + 1
+
+    def record_batch(self, endpoint, operation, outcome, size):
+        """Resultado de um lote enviado ao NetBox: 'ok', 'dividido' ou 'rejeitado'."""
+        key = (endpoint, operation, outcome)
+        with self._lock:
+            entry = self.batches.setdefault(key, {"batches": 0, "objects": 0})
+            entry["batches"] += 1
+            entry["objects"] += size
+
+    def export(self):
+        """Estado bruto das métricas, para consolidação no processo principal."""
+        with self._lock:
+            return {"phases": self.phases, "http": self.http, "retries": self.retries, "batches": self.batches,
+                    "cache": self.cache}
+
+    def merge(self, shard, state):
+        """Soma as métricas de uma partição às desta execução; os spans recebem o nome da partição."""
+        with self._lock:
+            for span in state["phases"]:
+                self.phases.append({**span, "name": f"{shard}/{span['name']}", "level": span["level"] + 1})
+            for key, entry in state["http"].items():
+                current = self.http.setdefault(key, {**entry, "statuses": {}, "buckets": [0] * len(entry["buckets"]),
+                                                     "count": 0, "errors": 0, "seconds": 0.0,
+                                                     "sent_bytes": 0, "received_bytes": 0})
+                for field in ("count", "errors", "seconds", "sent_bytes", "received_bytes"):
+                    current[field] += entry[field]
+                for status, count in entry["statuses"].items():
+                    current["statuses"][status] = current["statuses"].get(status, 0) + count
+                current["buckets"] = [a + b for a, b in zip(current["buckets"], entry["buckets"])]
+            for service, count in state["retries"].items():
+                self.retries[service] = self.retries.get(service, 0) + count
+            for key, entry in state["batches"].items():
+                current = self.batches.setdefault(key, {"batches": 0, "objects": 0})
+                current["batches"] += entry["batches"]
+                current["objects"] += entry["objects"]
+            for key, count in state["cache"].items():
+                self.cache[key] = self.cache.get(key, 0) + count
+
+    def finish(self, status):
+        now = time.monotonic()
+        with self._lock:
+            for level in sorted(self._open, reverse=True):
+                self._close(level, now)
+        self.status = status
+        self.duration = now - self._started
+
+    def report(self):
+        """Relatório da execução em formato JSON-serializável."""
+        return {
+            "started_at": self.started_at.isoformat(),
+            "duration_seconds": round(self.duration, 3),
+            "status": self.status,
+            "phases": self.phases,
+            "http": [
+                {"service": service, "method": method, "endpoint": endpoint,
+                 **{key: value for key, value in entry.items() if key != "buckets"},
+                 "seconds": round(entry["seconds"], 3),
+                 "latency_buckets": dict(zip([*map(str, LATENCY_BUCKETS), "+Inf"], entry["buckets"]))}
+                for (service, method, endpoint), entry in sorted(self.http.items())
+            ],
+            "retries": self.retries,
+            "batches": [
+                {"endpoint": endpoint, "operation": operation, "outcome": outcome, **entry}
+                for (endpoint, operation, outcome), entry in sorted(self.batches.items())
+            ],
+            "http_cache": [
+                {"service": service, "outcome": outcome, "responses": count}
+                for (service, outcome), count in sorted(self.cache.items())
+            ],
+            "summary": self.summary,
+        }
+
+    def prometheus(self, openmetrics=False):
+        """Métricas no formato de exposição do Prometheus (ou OpenMetrics)."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            # No OpenMetrics o nome da família de um counter não leva o sufixo '_total'
+            family = name[:-len("_total")] if openmetrics and kind == "counter" else name
+            lines.append(f"# HELP {METRIC_PREFIX}_{family} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{family} {kind}")
+            for suffix, labels, value in samples:
+                label_str = ",".join(f'{key}="{value_}"' for key, value_ in labels.items())
+                lines.append(f"{METRIC_PREFIX}_{family}{suffix}{{{label_str}}} {value}" if label_str
+                             else f"{METRIC_PREFIX}_{family}{suffix} {value}")
+
+        metric("success", "gauge", "1 se a última execução terminou com sucesso.", [("", {}, int(self.status == "success"))])
+        metric("last_run_timestamp_seconds", "gauge", "Início da última execução (epoch).", [("", {}, int(self.started_at.timestamp()))])
+        metric("duration_seconds", "gauge", "Duração total da execução.", [("", {}, round(self.duration, 3))])
+        metric("phase_duration_seconds", "gauge", "Duração de cada FASE/Etapa.",
+               [("", {"phase": span["name"]}, span.get("seconds", 0)) for span in self.phases])
+
+        requests_total, bytes_total, histogram = [], [], []
+        for (service, method, endpoint), entry in sorted(self.http.items()):
+            labels = {"service": service, "method": method, "endpoint": endpoint}
+            for status, count in sorted(entry["statuses"].items()):
+                requests_total.append(("_total" if openmetrics else "", {**labels, "status": status}, count))
+            bytes_total.append(("_total" if openmetrics else "", {**labels, "direction": "sent"}, entry["sent_bytes"]))
+            bytes_total.append(("_total" if openmetrics else "", {**labels, "direction": "received"}, entry["received_bytes"]))
+            cumulative = 0
+            for limit, count in zip([*map(str, LATENCY_BUCKETS), "+Inf"], entry["buckets"]):
+                cumulative += count
+                histogram.append(("_bucket", {**labels, "le": limit}, cumulative))
+            histogram.append(("_sum", labels, round(entry["seconds"], 6)))
+            histogram.append(("_count", labels, entry["count"]))
+        metric("http_requests_total", "counter", "Requisições HTTP por serviço, endpoint e status.", requests_total)
+        metric("http_bytes_total", "counter", "Bytes HTTP enviados e recebidos.", bytes_total)
+        metric("http_request_duration_seconds", "histogram", "Latência das requisições HTTP.", histogram)
+        metric("http_retries_total", "counter", "Novas tentativas de requisições HTTP.",
+               [("_total" if openmetrics else "", {"service": service}, count) for service, count in sorted(self.retries.items())])
+
+        batch_samples, object_samples = [], []
+        for (endpoint, operation, outcome), entry in sorted(self.batches.items()):
+            labels = {"endpoint": endpoint, "operation": operation, "outcome": outcome}
+            batch_samples.append(("_total" if openmetrics else "", labels, entry["batches"]))
+            object_samples.append(("_total" if openmetrics else "", labels, entry["objects"]))
+        metric("http_cache_responses_total", "counter", "Respostas GET por resultado do cache HTTP (hit, revalidated, miss).",
+               [("_total" if openmetrics else "", {"service": service, "outcome": outcome}, count)
+                for (service, outcome), count in sorted(self.cache.items())])
+        metric("batches_total", "counter", "Lotes enviados ao NetBox por resultado.", batch_samples)
+        metric("batch_objects_total", "counter", "Objetos enviados ao NetBox por resultado do lote.", object_samples)
+        metric("objects", "gauge", "Objetos processados na última execução.",
+               [("", {"kind": kind}, value) for kind, value in sorted(self.summary.items())])
+
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, status):
+        """Fecha os spans e grava o relatório JSON e as métricas, conforme configurado."""
+        self.finish(status)
+        if REPORT_PATH:
+            with open(REPORT_PATH, "w", encoding="utf-8") as f:
+                json.dump(self.report(), f, indent=2, ensure_ascii=False)
+            log.info(f"   - Relatório da execução salvo em: {REPORT_PATH}")
+        if METRICS_PATH:
+            # Grava e renomeia: o textfile collector nunca lê um arquivo pela metade
+            tmp_path = f"{METRICS_PATH}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus(openmetrics=METRICS_FORMAT == "openmetrics"))
+            os.replace(tmp_path, METRICS_PATH)
+
+_metrics = RunMetrics()
+
+def print_phase(msg):
+    """Registra o título de uma FASE/Etapa, que passa a acompanhar os registros seguintes, e abre o span nas métricas."""
+    title = msg.strip()
+    _log_context["phase"] = title.lstrip("- ").split(":")[0]
+    log.info(msg)
+    _metrics.mark_phase(title)
+
+# --- TRANSPORTE HTTP ---
+
+class TokenBucket:
+    """Limitador de taxa (token bucket): `rate` requisições por segundo, com rajada de até `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Consome um token sem esperar; False se não houver token disponível."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_seconds = (1 - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+def _retry_after(response):
+    """Segundos indicados pelo cabeçalho Retry-After (número ou data HTTP), ou None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+class SyncSession(requests.Session):
+    """Sessão HTTP compartilhada pelas threads da sincronização.
+
+    - pool de conexões dimensionado para as leituras e escritas simultâneas;
+    - limite de taxa por host (RATE_LIMIT/RATE_BURST);
+    - novas tentativas com backoff exponencial e jitter, respeitando Retry-After (até HTTP_BACKOFF_MAX). Métodos
+      idempotentes são repetidos em falhas de conexão e 429/502/503/504; POST apenas em 429,
+      quando o servidor garante que a requisição não foi processada.
+    """
+
+    IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "PATCH", "DELETE"})
+    RETRY_STATUS = frozenset({429, 502, 503, 504})
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+        pool = {"pool_connections": 4, "pool_maxsize": max(10, PAGE_WORKERS, WRITE_WORKERS * 2)}
+        adapter = CachingAdapter(_http_cache, **pool) if _http_cache is not None else requests.adapters.HTTPAdapter(**pool)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+    def _throttle(self, url):
+        if RATE_LIMIT <= 0:
+            return
+        host = urlsplit(url).netloc
+        with self._buckets_lock:
+            bucket = self._buckets.setdefault(host, TokenBucket(RATE_LIMIT, RATE_BURST))
+        bucket.acquire()
+
+    def request(self, method, url, *args, **kwargs):
+        idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        for attempt in range(HTTP_RETRIES + 1):
+            self._throttle(url)
+            backoff = min(HTTP_BACKOFF_MAX, HTTP_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.5)
+            started = time.monotonic()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                _metrics.record_request(self.service, method, url, None, time.monotonic() - started, 0, 0)
+                if not idempotent or attempt == HTTP_RETRIES:
+                    raise
+                delay, reason = backoff, type(e).__name__
+            else:
+                body = response.request.body or b""
+                # Respostas servidas pelo cache não chegam ao servidor; revalidações custam um 304 sem corpo
+                cache_outcome = response.headers.get(CACHE_HEADER)
+                if cache_outcome:
+                    _metrics.record_cache(self.service, cache_outcome)
+                if cache_outcome == "revalidated":
+                    _metrics.record_request(self.service, method, url, 304, time.monotonic() - started, len(body), 0)
+                elif cache_outcome != "hit":
+                    _metrics.record_request(self.service, method, url, response.status_code, time.monotonic() - started,
+                                            len(body), len(response.content))
+                status = response.status_code
+                retryable = status == 429 or (idempotent and status in self.RETRY_STATUS)
+                if not retryable or attempt == HTTP_RETRIES:
+                    return response
+                # Retry-After também é limitado a HTTP_BACKOFF_MAX; a resposta descartada libera a conexão do pool
+                retry_after = _retry_after(response)
+                delay = backoff if retry_after is None else min(HTTP_BACKOFF_MAX, retry_after)
+                reason = f"HTTP {status}"
+                response.close()
+            _metrics.record_retry(self.service)
+            log_http.warning(f"   - AVISO: {method} {urlsplit(url).path} falhou ({reason}); tentativa {attempt + 2}/{HTTP_RETRIES + 1} em {delay:.1f}s")
+            time.sleep(delay)
+
+# Cache de respostas compartilhado pelas duas sessões (None = desativado)
+_http_cache = ResponseCache(
+    HTTP_CACHE_PATH, memory_bytes=int(HTTP_CACHE_MEMORY_MB * 1024 * 1024),
+    max_entries=HTTP_CACHE_MAX_ENTRIES, policies=HTTP_CACHE_POLICIES,
+) if HTTP_CACHE else None
 
 # Sessões de Requests para reutilização de conexão
-awx_session = requests.Session()
+awx_session = SyncSession("awx")
 awx_session.auth = (AWX_USER, AWX_PASSWORD)
 awx_session.verify = False
 
-netbox_session = requests.Session()
+netbox_session = SyncSession("netbox")
 netbox_session.headers.update({
     "Authorization": f"Token {NETBOX_TOKEN}",
     "Content-Type": "application/json",
@@ -47,293 +627,1726 @@ netbox_session.verify = False
 # Cache Global para armazenar o estado do NetBox
 _cache = {}
 
+# Estado da execução: falhas de escrita e checkpoint do AWX pendente de gravação
+_run_state = {"failed_batches": 0, "rejected_objects": 0, "rejects_file": None, "errors_file": None,
+              "suppressed_failures": 0, "awx_checkpoint": None, "awx_complete": False}
+_run_state_lock = threading.Lock()
+
 # --- FUNÇÕES DE COLETA E UTILIDADES OTIMIZADAS ---
 
-def _paginated_get(session, base_url, endpoint, params=None):
+def _absolute_url(base_url, url):
+    """Converte URLs relativas (ex.: 'next' do AWX) em absolutas."""
+    if url and url.startswith('/'):
+        return f"{base_url}{url}"
+    return url
+
+def _get_page(session, url, endpoint):
+    """Busca uma única página; falhas são registradas e propagadas ao chamador."""
+    try:
+        r = session.get(url, timeout=180)
+        r.raise_for_status()
+        return r.json()
+    except requests.exceptions.RequestException as e:
+        log_http.error(f"ERRO: Falha ao coletar dados de {endpoint} ({url}): {e}")
+        raise
+
+def _remaining_page_urls(next_url, count, page_len):
+    """Monta as URLs das páginas restantes a partir do link 'next' da primeira página.
+
+    Suporta os dois estilos de paginação: limit/offset (NetBox) e page/page_size (AWX).
+    """
+    parts = urlsplit(next_url)
+    # Lista de pares (e não dict) para preservar filtros repetidos, ex.: virtual_machine_id=1&virtual_machine_id=2
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    current = dict(query)
+    if "offset" in current:
+        step = int(current.get("limit") or page_len)
+        key, values = "offset", range(int(current["offset"]), count, step)
+    elif "page" in current:
+        last_page = -(-count // page_len)
+        key, values = "page", range(int(current["page"]), last_page + 1)
+    else:
+        return None
+    other_params = [(name, value) for name, value in query if name != key]
+    return [parts._replace(query=urlencode(other_params + [(key, str(value))])).geturl() for value in values]
+
+def _iter_paginated(session, base_url, endpoint, params=None, workers=None):
+    """Percorre um endpoint paginado, entregando os registros à medida que as páginas chegam.
+
+    Lê o 'count' da primeira página e busca as demais em paralelo (até `workers`
+    simultâneas, com no máximo `workers` páginas à frente do consumidor), preservando
+    a ordem dos resultados. Qualquer página com falha interrompe a coleta com exceção,
+    em vez de produzir um resultado parcial.
+    """
+    workers = PAGE_WORKERS if workers is None else max(1, workers)
+    size_param = "page_size" if session is awx_session else "limit"
+    param_str = f"&{urlencode(params)}" if params else ""
+    url = f"{base_url}/api/{endpoint}/?{size_param}={PAGE_SIZE}{param_str}"
+
+    data = _get_page(session, url, endpoint)
+    results = data.get("results", [])
+    next_url = _absolute_url(base_url, data.get("next"))
+    page_urls = None
+    if next_url and workers > 1 and results and data.get("count"):
+        page_urls = _remaining_page_urls(next_url, data["count"], len(results))
+    yield from results
+
+    if page_urls is None:
+        # Modo sequencial: segue os links 'next' um a um
+        while next_url:
+            data = _get_page(session, next_url, endpoint)
+            yield from data.get("results", [])
+            next_url = _absolute_url(base_url, data.get("next"))
+        return
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(page_urls))) as executor:
+        pending = deque()
+        for page_url in page_urls:
+            pending.append(executor.submit(_get_page, session, page_url, endpoint))
+            if len(pending) >= workers:
+                yield from pending.popleft().result().get("results", [])
+        while pending:
+            yield from pending.popleft().result().get("results", [])
+
+def _paginated_get(session, base_url, endpoint, params=None, workers=None):
     """Coleta todos os resultados de um endpoint paginado, tratando URLs relativas."""
+    return list(_iter_paginated(session, base_url, endpoint, params, workers))
+
+# --- CARGA DO ESTADO VIA GRAPHQL ---
+
+# VMs com interfaces, IPs atribuídos, tags e IPs primários; só os campos usados na reconciliação.
+# As tags (referências do índice) vêm junto da primeira página
+GRAPHQL_STATE_QUERY = """
+query ($offset: Int!, $limit: Int!, $tags: Boolean!) {
+  virtual_machine_list(pagination: {offset: $offset, limit: $limit}) {
+    id name status vcpus memory disk comments
+    site { id } cluster { id } role { id } tenant { id }
+    primary_ip4 { id } primary_ip6 { id } tags { id }
+    interfaces { id name ip_addresses { id address } }
+  }
+  tag_list @include(if: $tags) { id name slug }
+}
+"""
+
+# Referências das VMs, devolvidas no formato aninhado da API REST ({'id': ...})
+GRAPHQL_REFERENCE_FIELDS = ("site", "cluster", "role", "tenant", "primary_ip4", "primary_ip6")
+
+def _graphql(query, variables):
+    """Executa uma consulta na API GraphQL do NetBox; erros da consulta viram ValueError."""
+    r = netbox_session.post(f"{NETBOX_URL}/graphql/", json={"query": query, "variables": variables}, timeout=180)
+    r.raise_for_status()
+    data = r.json()
+    if data.get("errors"):
+        raise ValueError("; ".join(error.get("message", str(error)) for error in data["errors"]))
+    return data["data"]
+
+def _graphql_ref(value):
+    return {"id": int(value["id"])} if value else None
+
+def _graphql_choice(value):
+    """Valor de um campo de escolha: o NetBox 4.3+ serializa o enum ('STATUS_ACTIVE'), versões anteriores o valor."""
+    return str(value).lower().removeprefix("status_") if value is not None else None
+
+def _read_graphql_vm(node, interfaces, ips):
+    """Converte uma VM da consulta GraphQL para o formato REST, acumulando suas interfaces e IPs."""
+    vm_id = int(node["id"])
+    for iface in node["interfaces"]:
+        iface_id = int(iface["id"])
+        interfaces.append({"id": iface_id, "name": iface["name"], "virtual_machine": {"id": vm_id}})
+        ips.extend({"id": int(ip["id"]), "address": ip["address"],
+                    "assigned_object_type": VMINTERFACE_TYPE, "assigned_object_id": iface_id}
+                   for ip in iface["ip_addresses"])
+    return {
+        "id": vm_id, "name": node["name"], "status": _graphql_choice(node["status"]),
+        "vcpus": node["vcpus"], "memory": node["memory"], "disk": node["disk"], "comments": node["comments"],
+        **{field: _graphql_ref(node[field]) for field in GRAPHQL_REFERENCE_FIELDS},
+        "tags": [{"id": int(tag["id"])} for tag in node["tags"]],
+    }
+
+def load_state_graphql():
+    """Carrega VMs, interfaces e IPs das VMs (e as tags do índice) com uma consulta GraphQL paginada.
+
+    O tamanho da primeira página define o passo das seguintes (o NetBox pode limitar 'limit'
+    a MAX_PAGE_SIZE); elas são buscadas em rodadas de até PAGE_WORKERS consultas paralelas,
+    até a primeira página vazia. Retorna {'vms', 'interfaces', 'ips'} no formato da API REST,
+    ou None se a consulta falhar (o chamador volta para a API REST).
+    """
+    def fetch(offset):
+        return _graphql(GRAPHQL_STATE_QUERY, {"offset": offset, "limit": PAGE_SIZE, "tags": offset == 0})
+
+    vms, interfaces, ips = [], [], []
+    try:
+        data = fetch(0)
+        _refs.fill("extras/tags", [{**tag, "id": int(tag["id"])} for tag in data["tag_list"]])
+        nodes = data["virtual_machine_list"]
+        vms.extend(_read_graphql_vm(node, interfaces, ips) for node in nodes)
+        step = len(nodes)
+        # Primeira página menor que PAGE_SIZE: fim dos dados ou limite do servidor; uma consulta decide
+        workers = PAGE_WORKERS if step == PAGE_SIZE else 1
+        with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+            offset, done = step, not step
+            while not done:
+                offsets = [offset + i * step for i in range(workers)]
+                for data in executor.map(fetch, offsets):
+                    nodes = data["virtual_machine_list"]
+                    vms.extend(_read_graphql_vm(node, interfaces, ips) for node in nodes)
+                    done = done or not nodes
+                offset += workers * step
+                workers = PAGE_WORKERS
+    except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+        log_state.warning(f"   - AVISO: Falha na carga via GraphQL ({e}); usando a API REST.")
+        return None
+    log_state.info(f"   - Estado carregado via GraphQL: {len(vms)} VMs, {len(interfaces)} interfaces, {len(ips)} IPs.")
+    return {"vms": vms, "interfaces": interfaces, "ips": ips}
+
+# --- SNAPSHOT LOCAL DO ESTADO DO NETBOX ---
+
+# Chave natural de cada endpoint (padrão: 'name')
+NATURAL_KEYS = {
+    "virtualization/virtual-machines": lambda obj: obj["name"],
+    "extras/tags": lambda obj: obj["slug"],
+    "virtualization/interfaces": lambda obj: f"{(obj.get('virtual_machine') or {}).get('id')}:{obj['name']}",
+    "ipam/ip-addresses": lambda obj: obj["address"],
+}
+
+# Margem de sobreposição para tolerar diferenças de relógio entre o script e o NetBox
+SNAPSHOT_OVERLAP = timedelta(minutes=5)
+
+class NetBoxSnapshot:
+    """Cópia local (SQLite) dos objetos do NetBox, indexada por ID e chave natural.
+
+    Na primeira carga de cada endpoint, e a cada SNAPSHOT_FULL_INTERVAL, faz uma
+    verificação completa que substitui o conteúdo local (detectando exclusões).
+    Nas demais execuções busca apenas objetos com 'last_updated' posterior à última sincronização.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS objects (
+                endpoint TEXT NOT NULL, id INTEGER NOT NULL, natural_key TEXT, data TEXT NOT NULL,
+                PRIMARY KEY (endpoint, id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_objects_natural_key ON objects (endpoint, natural_key);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                endpoint TEXT PRIMARY KEY, last_sync TEXT NOT NULL, last_full TEXT NOT NULL
+            );
+        """)
+
+    def _upsert(self, endpoint, objects):
+        key_func = NATURAL_KEYS.get(endpoint, lambda obj: obj.get("name"))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO objects (endpoint, id, natural_key, data) VALUES (?, ?, ?, ?)",
+            ((endpoint, obj["id"], key_func(obj), json.dumps(obj, ensure_ascii=False)) for obj in objects)
+        )
+
+    def load(self, endpoint):
+        """Atualiza o snapshot do endpoint e retorna todos os seus objetos."""
+        now = datetime.now(timezone.utc)
+        state = self.conn.execute("SELECT last_sync, last_full FROM sync_state WHERE endpoint = ?", (endpoint,)).fetchone()
+
+        if state is None or now - datetime.fromisoformat(state[1]) >= SNAPSHOT_FULL_INTERVAL:
+            objects = _paginated_get(netbox_session, NETBOX_URL, endpoint)
+            with self.conn:
+                self.conn.execute("DELETE FROM objects WHERE endpoint = ?", (endpoint,))
+                self._upsert(endpoint, objects)
+                self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)", (endpoint, now.isoformat(), now.isoformat()))
+            log_state.info(f"   - Snapshot '{endpoint}': verificação completa ({len(objects)} objetos).")
+            return objects
+
+        since = (datetime.fromisoformat(state[0]) - SNAPSHOT_OVERLAP).isoformat()
+        changed = _paginated_get(netbox_session, NETBOX_URL, endpoint, {"last_updated__gte": since})
+        with self.conn:
+            self._upsert(endpoint, changed)
+            self.conn.execute("UPDATE sync_state SET last_sync = ? WHERE endpoint = ?", (now.isoformat(), endpoint))
+        log_state.info(f"   - Snapshot '{endpoint}': {len(changed)} objetos alterados desde {since}.")
+        rows = self.conn.execute("SELECT data FROM objects WHERE endpoint = ? ORDER BY id", (endpoint,))
+        return [json.loads(row[0]) for row in rows]
+
+    def delete(self, endpoint, ids):
+        """Remove objetos excluídos pela sincronização, que a carga incremental não detecta.
+
+        Como no NetBox, excluir uma VM exclui suas interfaces, e excluir uma interface exclui seus IPs.
+        """
+        ids = list(ids)
+        with self.conn:
+            self.conn.executemany("DELETE FROM objects WHERE endpoint = ? AND id = ?", ((endpoint, id) for id in ids))
+            if endpoint == "virtualization/virtual-machines":
+                interface_ids = [
+                    row[0] for vm_id in ids for row in self.conn.execute(
+                        "SELECT id FROM objects WHERE endpoint = 'virtualization/interfaces' AND natural_key LIKE ?",
+                        (f"{vm_id}:%",))
+                ]
+                self.delete("virtualization/interfaces", interface_ids)
+            elif endpoint == "virtualization/interfaces":
+                self.conn.executemany(
+                    "DELETE FROM objects WHERE endpoint = 'ipam/ip-addresses'"
+                    " AND json_extract(data, '$.assigned_object_type') = ? AND json_extract(data, '$.assigned_object_id') = ?",
+                    ((VMINTERFACE_TYPE, id) for id in ids)
+                )
+
+_snapshot = NetBoxSnapshot(SNAPSHOT_PATH) if SNAPSHOT_PATH else None
+
+def load_netbox_objects(endpoint):
+    """Carrega todos os objetos de um endpoint do NetBox, via snapshot local quando habilitado."""
+    if _snapshot is None:
+        return _paginated_get(netbox_session, NETBOX_URL, endpoint)
+    return _snapshot.load(endpoint)
+
+def _load_awx_checkpoint():
+    """Lê o checkpoint da última coleta bem-sucedida do AWX ({} se inexistente)."""
+    if not AWX_CHECKPOINT_PATH or not os.path.exists(AWX_CHECKPOINT_PATH):
+        return {}
+    with open(AWX_CHECKPOINT_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_awx_checkpoint():
+    """Grava o checkpoint pendente; só deve ser chamado após as escritas no NetBox terem sucesso."""
+    checkpoint = _run_state["awx_checkpoint"]
+    if not AWX_CHECKPOINT_PATH or checkpoint is None:
+        return
+    tmp_path = f"{AWX_CHECKPOINT_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, AWX_CHECKPOINT_PATH)
+    log_awx.info(f"   - Checkpoint do AWX avançado para {checkpoint['modified']}.")
+
+class VMRecord:
+    """Registro compacto de uma VM do AWX, montado uma única vez no parse das variáveis do host.
+
+    Guarda só os campos usados pela sincronização, já normalizados: status, recursos,
+    nomes de site/cluster mapeados, função, tenant, tags (slug, nome, descrição) e IPs
+    (com máscara /32 ou /128, sem loopback e link-local; os primeiros IPv4 e IPv6 são os primários).
+    """
+
+    __slots__ = ("name", "inventory", "status", "vcpus", "memory", "disk", "datacenter", "cluster",
+                 "site_name", "cluster_name", "role", "tenant", "tags", "addresses", "primary_ip4", "primary_ip6")
+
+    def __init__(self, name, inventory, status, vcpus, memory, disk, datacenter, cluster, role, tenant, tags, addresses):
+        self.name = name
+        self.inventory = inventory
+        self.status = status
+        self.vcpus = vcpus
+        self.memory = memory
+        self.disk = disk
+        self.datacenter = datacenter
+        self.cluster = cluster
+        self.site_name = DATACENTER_TO_SITE_MAP.get(datacenter)
+        self.cluster_name = CLUSTER_MAP.get(cluster)
+        self.role = role
+        self.tenant = tenant
+        self.tags = tags
+        self.addresses = addresses
+        self.primary_ip4 = next((address for address in addresses if ":" not in address), None)
+        self.primary_ip6 = next((address for address in addresses if ":" in address), None)
+
+    @classmethod
+    def from_vars(cls, vars_dict, inventory):
+        """Monta o registro a partir das variáveis do host; None se o host não tiver 'vm_name'."""
+        if not vars_dict.get("vm_name"):
+            return None
+        tags = [tag for tag in vars_dict.get("vm_tags") or [] if isinstance(tag, dict)]
+        ip_addresses = [ip for ip in map(_vm_address, vars_dict.get("vm_ip_addresses") or []) if ip]
+        return cls(
+            name=vars_dict["vm_name"],
+            inventory=inventory,
+            status="offline" if vars_dict.get("vm_power_state") == "poweredOff" else "active",
+            vcpus=vars_dict.get("vm_cpu_count"),
+            memory=int(vars_dict.get("vm_memory_mb") or 0),
+            disk=int(vars_dict.get("vm_disk_total_gb") or 0),
+            datacenter=vars_dict.get("vm_datacenter", "ATI-SLC-HCI"),
+            cluster=vars_dict.get("vm_cluster", "Cluster vSAN"),
+            role=next((tag.get("name") for tag in tags if tag.get("category") == "Função"), None),
+            tenant=next((tag.get("name") for tag in tags if tag.get("category") == "Entidade"), None),
+            tags=tuple(
+                (slugify(f"{tag['category']}-{tag['name']}"), tag["name"], tag.get("description", ""))
+                for tag in tags if tag.get("name") and tag.get("category")
+            ),
+            addresses=tuple(dict.fromkeys(f"{ip}/128" if ip.version == 6 else f"{ip}/32" for ip in ip_addresses)),
+        )
+
+# Campos de uma VM usados após a FASE 3 (IPs e poda): no modo streaming os VMRecord completos,
+# com tags e referências, não ficam em memória até a FASE 5
+SyncedVM = namedtuple("SyncedVM", "name cluster_name addresses primary_ip4 primary_ip6")
+
+def _vm_address(value):
+    """Endereço IP reportado pelo VMware Tools, ou None se for inválido, loopback ou link-local.
+
+    Endereços como 127.0.0.1, ::1 e fe80::/10 existem em toda VM e não identificam nenhuma delas.
+    """
+    try:
+        ip = ipaddress.ip_address(str(value).split("%")[0])
+    except ValueError:
+        return None
+    return None if ip.is_loopback or ip.is_link_local or ip.is_unspecified else ip
+
+def iter_awx_hosts():
+    """Entrega os hosts dos inventários AWX_INVENTORIES à medida que as páginas chegam.
+
+    Com SYNC_AWX_CHECKPOINT_PATH definido, coleta apenas hosts com 'modified' posterior
+    ao último checkpoint; a cada AWX_FULL_INTERVAL faz uma varredura completa, que também
+    reporta os hosts removidos do AWX desde a varredura anterior. A coleta acontece à medida
+    que os hosts são consumidos: no modo streaming, dentro da FASE 3.
+    """
+    yield from _iter_inventory_hosts(*select_awx_inventories())
+
+def select_awx_inventories():
+    """Inventários de AWX_INVENTORIES no AWX; retorna (inventários, se todos foram encontrados)."""
+    inventories = {inv["name"]: inv for inv in _paginated_get(awx_session, AWX_URL, "v2/inventories")}
+    if AWX_INVENTORIES == ["all"]:
+        return list(inventories.values()), True
+    missing = [name for name in AWX_INVENTORIES if name not in inventories]
+    for name in missing:
+        log_awx.error(f"ERRO: Inventário '{name}' não encontrado.")
+    return [inventories[name] for name in AWX_INVENTORIES if name in inventories], not missing
+
+def _host_vars(host):
+    """Variáveis de um host do AWX (texto JSON ou objeto); None se ilegíveis."""
+    if not isinstance(host.get("variables"), str):
+        return host.get("variables", {})
+    try:
+        return json.loads(host.get("variables", "{}"))
+    except json.JSONDecodeError:
+        return None
+
+def _iter_inventory_hosts(selected, complete):
+    """Hosts dos inventários selecionados, com a lógica de checkpoint descrita em iter_awx_hosts.
+
+    Ao final registra em _run_state["awx_complete"] se a coleta viu todas as VMs do AWX
+    (varredura completa, sem filtro de host e sem variáveis ilegíveis), condição para a poda.
+    """
+    _run_state["awx_complete"] = False
+    if not selected:
+        return
+
+    now = datetime.now(timezone.utc)
+    checkpoint = _load_awx_checkpoint()
+    full_sweep = (
+        not checkpoint.get("modified")
+        or now - datetime.fromisoformat(checkpoint["last_full"]) >= AWX_FULL_INTERVAL
+    )
+    params = {} if full_sweep else {"modified__gt": checkpoint["modified"]}
+    if params:
+        log_awx.info(f"   - Coleta incremental: hosts modificados após {checkpoint['modified']}.")
+    if HOST_FILTER:
+        params["name__icontains"] = HOST_FILTER
+        log_awx.info(f"   - Filtro de host: '{HOST_FILTER}' (o checkpoint do AWX não é avançado).")
+
+    host_names, latest_modified, collected = set(), "", 0
+    for inventory in selected:
+        for host in _iter_paginated(awx_session, AWX_URL, f"v2/inventories/{inventory['id']}/hosts", params):
+            host_names.add(host["name"])
+            latest_modified = max(latest_modified, host.get("modified") or "")
+            vars_dict = _host_vars(host)
+            if vars_dict is None:
+                complete = False
+                continue
+            record = VMRecord.from_vars(vars_dict, inventory["name"])
+            if record is None:
+                continue
+            collected += 1
+            yield record
+
+    log_awx.info(f"   - Coleta do AWX concluída: {collected} VMs encontradas.")
+    _run_state["awx_complete"] = complete and full_sweep and not HOST_FILTER
+
+    # Uma coleta filtrada não vê todos os hosts: não serve de checkpoint nem de varredura completa
+    if HOST_FILTER:
+        return
+    if full_sweep:
+        removed = sorted(set(checkpoint.get("hosts", [])) - host_names)
+        if removed:
+            log_awx.info(f"   - {len(removed)} host(s) removido(s) do AWX desde a última varredura: {', '.join(removed)}")
+        known_hosts, last_full = host_names, now.isoformat()
+    else:
+        known_hosts, last_full = host_names | set(checkpoint.get("hosts", [])), checkpoint["last_full"]
+    _run_state["awx_checkpoint"] = {
+        "modified": latest_modified or checkpoint.get("modified"),
+        "last_full": last_full,
+        "hosts": sorted(known_hosts),
+    }
+
+def load_scoped_objects(endpoint, filter_name, values, brief=True):
+    """Carrega apenas os objetos em que `filter_name` está em `values`.
+
+    Os valores são agrupados em consultas de até FILTER_CHUNK_SIZE filtros, executadas em
+    paralelo; com `brief` o NetBox retorna a representação resumida dos objetos.
+    """
+    values = sorted(set(values))
+    chunks = [values[i:i + FILTER_CHUNK_SIZE] for i in range(0, len(values), FILTER_CHUNK_SIZE)]
+
+    def fetch(chunk):
+        params = [(filter_name, value) for value in chunk] + ([("brief", "1")] if brief else [])
+        return _paginated_get(netbox_session, NETBOX_URL, endpoint, params, workers=1)
+
     results = []
-    param_str = f"&{requests.compat.urlencode(params)}" if params else ""
-    url = f"{base_url}/api/{endpoint}/?limit=500{param_str}"
-    
-    while url:
-        try:
-            r = session.get(url, timeout=180)
-            r.raise_for_status()
-            data = r.json()
-            results.extend(data.get("results", []))
-            
-            next_url = data.get("next")
-            if next_url and next_url.startswith('/'):
-                url = f"{base_url}{next_url}"
-            else:
-                url = next_url
-                
-        except requests.exceptions.RequestException as e:
-            print_flush(f"ERRO: Falha ao coletar dados de {endpoint}: {e}")
-            return []
+    if chunks:
+        with ThreadPoolExecutor(max_workers=min(PAGE_WORKERS, len(chunks))) as executor:
+            for chunk_results in executor.map(fetch, chunks):
+                results.extend(chunk_results)
     return results
 
 def list_awx_hosts():
-    """Coleta e processa os hosts do inventário 'VMware Inventory' no AWX."""
-    print_flush("FASE 1: Coletando dados do AWX...")
-    inventories = _paginated_get(awx_session, AWX_URL, "v2/inventories")
-    vmware_inv = next((inv for inv in inventories if inv["name"] == "VMware Inventory"), None)
-
-    if not vmware_inv:
-        print_flush("ERRO: Inventário 'VMware Inventory' não encontrado.")
-        return []
-
-    hosts_raw = _paginated_get(awx_session, AWX_URL, f"v2/inventories/{vmware_inv['id']}/hosts")
-    all_hosts = []
-    for host in hosts_raw:
-        try:
-            vars_dict = json.loads(host.get("variables", "{}")) if isinstance(host.get("variables"), str) else host.get("variables", {})
-            vars_dict.setdefault("vm_datacenter", "ATI-SLC-HCI")
-            vars_dict.setdefault("vm_cluster", "Cluster vSAN")
-            all_hosts.append(vars_dict)
-        except json.JSONDecodeError:
-            continue
-    print_flush(f"   - Coleta do AWX concluída: {len(all_hosts)} VMs encontradas.")
-    return all_hosts
+    """FASE 1: coleta e processa os hosts dos inventários AWX_INVENTORIES."""
+    print_phase("FASE 1: Coletando dados do AWX...")
+    return list(iter_awx_hosts())
 
 def slugify(text):
     text = text.lower()
     return "".join(c for c in text if c.isalnum() or c == " ").replace(" ", "-")
 
-def get_or_create_dependency(endpoint, name, extra_payload={}):
-    """Garantir a existência de um objeto de dependência (site, role, etc) usando cache."""
-    if not name: return None # Não processar nomes vazios
-    cache_key = f"dep_{endpoint}"
-    if cache_key not in _cache:
-        _cache[cache_key] = {item['name']: item for item in _paginated_get(netbox_session, NETBOX_URL, endpoint)}
+class ReferenceIndex:
+    """Índice único dos objetos de referência do NetBox (sites, clusters, funções, tenants, tags).
 
-    if name in _cache[cache_key]:
-        return _cache[cache_key][name]['id']
-    
+    Cada endpoint é carregado uma única vez e pode ser consultado por ID, nome ou slug.
+    Referências cuja criação o NetBox recusou ficam marcadas (cache negativo) e não são
+    reenviadas a cada VM.
+    """
+
+    KEYS = ("id", "name", "slug")
+
+    def __init__(self):
+        self._index = {}
+        self._failed = set()
+
+    def load(self, endpoint):
+        if endpoint not in self._index:
+            self._index[endpoint] = {key: {} for key in self.KEYS}
+            for obj in load_netbox_objects(endpoint):
+                self.add(endpoint, obj)
+        return self._index[endpoint]
+
+    def add(self, endpoint, obj):
+        index = self.load(endpoint)
+        for key in self.KEYS:
+            if obj.get(key) is not None:
+                index[key][obj[key]] = obj
+
+    def fill(self, endpoint, objects):
+        """Indexa objetos já lidos (ex.: tags da consulta GraphQL), se o endpoint ainda não foi carregado."""
+        if endpoint not in self._index:
+            self._index[endpoint] = {key: {} for key in self.KEYS}
+            for obj in objects:
+                self.add(endpoint, obj)
+
+    def get(self, endpoint, key, value):
+        return self.load(endpoint)[key].get(value)
+
+    def mark_failed(self, endpoint, key, value):
+        self._failed.add((endpoint, key, value))
+
+    def failed(self, endpoint, key, value):
+        return (endpoint, key, value) in self._failed
+
+    def count(self, endpoint):
+        return len(self.load(endpoint)["id"])
+
+    def export(self):
+        """Objetos já carregados, por endpoint (repassados aos processos da execução particionada)."""
+        return {endpoint: list(index["id"].values()) for endpoint, index in self._index.items()}
+
+    def preload(self, objects_by_endpoint):
+        """Substitui o índice pelos objetos informados, sem consultar o NetBox."""
+        self._index = {}
+        self._failed = set()
+        for endpoint, objects in objects_by_endpoint.items():
+            self._index[endpoint] = {key: {} for key in self.KEYS}
+            for obj in objects:
+                self.add(endpoint, obj)
+
+_refs = ReferenceIndex()
+
+def get_or_create_dependency(endpoint, name, extra_payload={}, create=True):
+    """Garantir a existência de um objeto de dependência (site, role, etc) usando o índice de referências.
+
+    A busca é feita pelo slug quando ele é informado em `extra_payload` (ex.: tags), senão pelo nome.
+    Sem `create`, ou se a criação já falhou nesta execução, apenas consulta o índice.
+    """
+    if not name: return None # Não processar nomes vazios
     payload = {"name": name, "slug": slugify(name), **extra_payload}
+    key = "slug" if "slug" in extra_payload else "name"
+    existing = _refs.get(endpoint, key, payload[key])
+    if existing:
+        return existing['id']
+    if not create or _refs.failed(endpoint, key, payload[key]):
+        return None
+    if _changeset is not None:
+        new_obj = _changeset.record(endpoint, 'post', [payload])[0]
+        _refs.add(endpoint, new_obj)
+        return new_obj['id']
+
     try:
         response = netbox_session.post(f"{NETBOX_URL}/api/{endpoint}/", json=payload, timeout=60)
         response.raise_for_status()
         new_obj = response.json()
-        _cache[cache_key][name] = new_obj
-        print_flush(f"   - Dependência criada: '{name}' em '{endpoint}'")
+        _refs.add(endpoint, new_obj)
+        log_write.info(f"   - Dependência criada: '{name}' em '{endpoint}'")
         return new_obj['id']
     except requests.exceptions.RequestException as e:
-        print_flush(f"   - ERRO ao criar dependência '{name}': {e.response.text}")
+        _refs.mark_failed(endpoint, key, payload[key])
+        log_write.error(f"   - ERRO ao criar dependência '{name}': {_error_details(e)}")
         return None
 
+class AdaptiveBatchSize:
+    """Tamanho de lote ajustado pela latência e pelos erros observados em um endpoint.
+
+    Cresce de forma aditiva enquanto os lotes terminam bem abaixo de BATCH_TARGET_SECONDS
+    e cai pela metade quando o lote é lento ou o NetBox sinaliza sobrecarga (5xx, 429, timeout).
+    """
+
+    def __init__(self):
+        self.size = BATCH_SIZE
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, overloaded):
+        with self._lock:
+            if overloaded or elapsed > BATCH_TARGET_SECONDS:
+                self.size = max(BATCH_SIZE_MIN, self.size // 2)
+            elif elapsed < BATCH_TARGET_SECONDS / 2:
+                self.size = min(BATCH_SIZE_MAX, self.size + max(1, BATCH_SIZE // 5))
+
+_batch_sizes = {}
+
+def batch_size_for(endpoint):
+    """Tamanho de lote atual do endpoint (aprendido ao longo da execução)."""
+    return _batch_sizes.setdefault(endpoint, AdaptiveBatchSize())
+
+def _error_details(error):
+    """Extrai o corpo de erro retornado pelo NetBox (JSON quando possível)."""
+    if error.response is None:
+        return str(error)
+    try:
+        return error.response.json()
+    except json.JSONDecodeError:
+        return error.response.text
+
+def _record_rejects(endpoint, operation, objects, status, details):
+    """Grava os objetos rejeitados em REJECTS_PATH, um por linha; o arquivo é recriado a cada execução."""
+    with _run_state_lock:
+        if _run_state["rejects_file"] is None:
+            _run_state["rejects_file"] = open(REJECTS_PATH, "w", encoding="utf-8")
+        rejects_file = _run_state["rejects_file"]
+        for obj in objects:
+            rejects_file.write(json.dumps({
+                "endpoint": endpoint, "operation": operation, "object": obj,
+                "status": status, "error": details, "timestamp": datetime.now().isoformat(),
+            }, ensure_ascii=False) + "\n")
+        rejects_file.flush()
+        _run_state["failed_batches"] += 1
+        _run_state["rejected_objects"] += len(objects)
+
+def _truncate(value):
+    """Texto (JSON, se não for string) limitado a LOG_PAYLOAD_CHARS caracteres para o log."""
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    if len(text) <= LOG_PAYLOAD_CHARS:
+        return text
+    return f"{text[:LOG_PAYLOAD_CHARS]}... (+{len(text) - LOG_PAYLOAD_CHARS} caracteres)"
+
+def _dump_error(endpoint, operation, status, error, batch):
+    """Grava o registro completo de uma falha de lote em ERROR_DUMP_PATH, recriado a cada execução."""
+    if not ERROR_DUMP_PATH:
+        return
+    with _run_state_lock:
+        if _run_state["errors_file"] is None:
+            _run_state["errors_file"] = open(ERROR_DUMP_PATH, "w", encoding="utf-8")
+        _run_state["errors_file"].write(json.dumps({
+            "timestamp": datetime.now().isoformat(), "phase": _log_context["phase"], "endpoint": endpoint,
+            "operation": operation, "status": status, "error": error, "batch": batch,
+        }, ensure_ascii=False, default=str) + "\n")
+        _run_state["errors_file"].flush()
+
+# Falhas de lote detalhadas no log: até LOG_FAILURES_PER_MINUTE por minuto
+_failure_log_bucket = TokenBucket(LOG_FAILURES_PER_MINUTE / 60, LOG_FAILURES_PER_MINUTE)
+
+# Respostas do NetBox que indicam objetos inválidos no lote (e não falha da requisição inteira)
+DATA_ERROR_STATUSES = (400, 409)
+
+def _send_batch(method, action_str, endpoint, operation, batch):
+    """Envia um lote ao NetBox e alimenta o tamanho adaptativo; retorna os objetos da resposta
+    (em exclusões, os objetos do lote excluídos com sucesso).
+
+    Se o NetBox recusar o lote por erro de dados (400/409, ou 404 em exclusões), o lote é dividido
+    ao meio e reenviado até isolar os objetos inválidos, que vão para o arquivo de rejeitos; os demais
+    são gravados. Objetos que já não existem contam como excluídos. Demais falhas (autenticação,
+    permissão, endpoint inexistente) rejeitam o lote inteiro, sem divisão.
+    """
+    log_write.debug(f"   - {action_str} lote de {len(batch)} objetos em /api/{endpoint}/...")
+    started = time.monotonic()
+    try:
+        response = method(f"{NETBOX_URL}/api/{endpoint}/", json=batch, timeout=180)
+        response.raise_for_status()
+        batch_size_for(endpoint).record(time.monotonic() - started, overloaded=False)
+        _metrics.record_batch(endpoint, operation, "ok", len(batch))
+        if response.status_code != 204 and response.content:
+            return response.json()
+        return batch if operation == 'delete' else []
+    except requests.exceptions.RequestException as e:
+        status = e.response.status_code if e.response is not None else None
+        overloaded = status is None or status == 429 or status >= 500
+        batch_size_for(endpoint).record(time.monotonic() - started, overloaded=overloaded)
+
+        if status == 404 and operation == 'delete' and len(batch) == 1:
+            log_write.debug(f"   - Objeto {batch[0].get('id')} já não existe em /api/{endpoint}/; considerado excluído.")
+            _metrics.record_batch(endpoint, operation, "ok", len(batch))
+            return batch
+        if (status in DATA_ERROR_STATUSES or (status == 404 and operation == 'delete')) and len(batch) > 1:
+            _metrics.record_batch(endpoint, operation, "dividido", len(batch))
+            middle = len(batch) // 2
+            log_write.debug(f"   - Lote de {len(batch)} objetos recusado em /api/{endpoint}/ (status {status}); dividindo para isolar os inválidos...")
+            return (_send_batch(method, action_str, endpoint, operation, batch[:middle])
+                    + _send_batch(method, action_str, endpoint, operation, batch[middle:]))
+
+        details = _error_details(e)
+        _metrics.record_batch(endpoint, operation, "rejeitado", len(batch))
+        _record_rejects(endpoint, operation, batch, status, details)
+        _dump_error(endpoint, operation, status, details, batch)
+        # O log recebe um resumo truncado (com limite de taxa); o registro completo fica em ERROR_DUMP_PATH
+        if LOG_FAILURES_PER_MINUTE <= 0 or _failure_log_bucket.try_acquire():
+            reason = f"status {status}" if e.response is not None else "erro de conexão"
+            log_write.error(
+                f"ERRO: Falha no lote de {action_str} para {endpoint} ({reason}, {len(batch)} objeto(s)): "
+                f"{_truncate(details)} | Lote: {_truncate(batch)}",
+                extra={"fields": {"endpoint": endpoint, "operation": operation, "status": status, "objects": len(batch)}},
+            )
+        else:
+            with _run_state_lock:
+                _run_state["suppressed_failures"] += 1
+        return []
+
 def bulk_api_call(endpoint, object_list, operation='post'):
-    """Função genérica para realizar operações de POST, PATCH ou DELETE em lote."""
+    """Função genérica para realizar operações de POST, PATCH ou DELETE em lote.
+
+    Mantém até WRITE_WORKERS lotes em andamento, com tamanho adaptativo por endpoint.
+    A chamada só retorna quando todos os lotes terminaram, e os objetos retornados seguem
+    a ordem de `object_list`; chamadas sucessivas (VMs, interfaces, IPs, IPs primários)
+    preservam assim a ordem de dependência entre si. No subcomando 'plan' as escritas são
+    apenas registradas no plano de alterações.
+    """
     if not object_list:
         return []
+    if _changeset is not None:
+        return _changeset.record(endpoint, operation, object_list)
     
     op_map = {
         'post': (netbox_session.post, "CRIANDO"), 'patch': (netbox_session.patch, "ATUALIZANDO"),
         'delete': (netbox_session.delete, "DELETANDO")
     }
     method, action_str = op_map[operation]
+    sizer = batch_size_for(endpoint)
     
-    created_objects = []
-    batch_size = 50
-    
-    for i in range(0, len(object_list), batch_size):
-        batch = object_list[i:i+batch_size]
-        print_flush(f"   - {action_str} lote de {len(batch)} objetos em /api/{endpoint}/...")
-        try:
-            response = method(f"{NETBOX_URL}/api/{endpoint}/", json=batch, timeout=180)
-            response.raise_for_status()
-            if response.status_code != 204 and response.content:
-                 created_objects.extend(response.json())
-        except requests.exceptions.RequestException as e:
-            print_flush(f"ERRO: Falha no lote de {action_str} para {endpoint}.")
-            if e.response:
-                print_flush(f"      Status Code: {e.response.status_code}")
-                try:
-                    print_flush(f"      Detalhes do Erro NetBox: {json.dumps(e.response.json(), indent=2, ensure_ascii=False)}")
-                except json.JSONDecodeError:
-                    print_flush(f"      Resposta Bruta (não JSON): {e.response.text}")
+    results = {}
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+        inflight = {}
+        position = 0
+        while position < len(object_list) or inflight:
+            while position < len(object_list) and len(inflight) < WRITE_WORKERS:
+                batch = object_list[position:position + sizer.size]
+                inflight[executor.submit(_send_batch, method, action_str, endpoint, operation, batch)] = position
+                position += len(batch)
+            done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[inflight.pop(future)] = future.result()
+
+    results = [obj for position in sorted(results) for obj in results[position]]
+    if operation == 'delete' and _snapshot is not None:
+        _snapshot.delete(endpoint, (obj["id"] for obj in results))
+    return results
+
+def replay_rejects(path):
+    """Reenvia os objetos de um arquivo de rejeitos, na ordem em que foram registrados."""
+    log_write.info(f"REPROCESSANDO REJEITOS DE {path}...")
+    with open(path, encoding="utf-8") as f:
+        rejects = [json.loads(line) for line in f if line.strip()]
+
+    groups = {}
+    for reject in rejects:
+        groups.setdefault((reject["endpoint"], reject["operation"]), []).append(reject["object"])
+    for (endpoint, operation), objects in groups.items():
+        bulk_api_call(endpoint, objects, operation)
+
+    log_write.info(f"   - Objetos reprocessados: {len(rejects)}")
+    log_write.info(f"   - Rejeitados novamente: {_run_state['rejected_objects']}")
+    if _run_state["suppressed_failures"]:
+        log_write.warning(f"   - Falhas de lote omitidas do log: {_run_state['suppressed_failures']} (registro completo em {ERROR_DUMP_PATH})")
+
+class BatchWriter:
+    """Acumula objetos e os envia a bulk_api_call assim que enchem os lotes simultâneos.
+
+    Com background=True os lotes são enviados por uma thread dedicada, sobrepondo as
+    escritas no NetBox à leitura do AWX; no máximo dois lotes ficam aguardando envio.
+    """
+
+    MAX_PENDING_BATCHES = 2
+
+    def __init__(self, endpoint, operation='post', background=False):
+        self.endpoint = endpoint
+        self.operation = operation
+        self.count = 0
+        self.results = []
+        self._batch = []
+        self._inflight = deque()
+        self._executor = ThreadPoolExecutor(max_workers=1) if background else None
+
+    def add(self, obj):
+        self._batch.append(obj)
+        self.count += 1
+        # Acumula o suficiente para ocupar todos os lotes simultâneos de bulk_api_call
+        if len(self._batch) >= batch_size_for(self.endpoint).size * WRITE_WORKERS:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        if self._executor is None:
+            self.results.extend(bulk_api_call(self.endpoint, batch, self.operation))
+            return
+        if len(self._inflight) >= self.MAX_PENDING_BATCHES:
+            self.results.extend(self._inflight.popleft().result())
+        self._inflight.append(self._executor.submit(bulk_api_call, self.endpoint, batch, self.operation))
+
+    def close(self):
+        """Envia o lote parcial, aguarda os envios pendentes e retorna os objetos retornados pela API."""
+        self.flush()
+        while self._inflight:
+            self.results.extend(self._inflight.popleft().result())
+        if self._executor is not None:
+            self._executor.shutdown()
+        return self.results
+
+# --- PLANO DE ALTERAÇÕES (PLAN / APPLY) ---
+
+CHANGESET_VERSION = 1
+
+# Campos que referenciam outros objetos por ID: no plano podem conter IDs provisórios
+CHANGESET_REFERENCE_FIELDS = ("id", "site", "cluster", "type", "role", "tenant", "virtual_machine",
+                              "assigned_object_id", "primary_ip4", "primary_ip6")
+# Referências que o NetBox devolve aninhadas ({'id': ...}) na leitura
+NESTED_REFERENCE_FIELDS = ("site", "cluster", "type", "role", "tenant", "virtual_machine", "primary_ip4", "primary_ip6")
+
+def is_planned(obj_id):
+    """Indica se o ID é provisório (objeto que o plano ainda vai criar)."""
+    return isinstance(obj_id, int) and obj_id < 0
+
+def _as_read(obj):
+    """Representação de leitura de um payload de escrita (referências aninhadas como o NetBox devolve)."""
+    return {
+        field: {"id": value} if field in NESTED_REFERENCE_FIELDS and isinstance(value, int) else value
+        for field, value in obj.items()
+    }
+
+class Changeset:
+    """Escritas calculadas pelo subcomando 'plan', na ordem em que a sincronização as faria.
+
+    Cada chamada de escrita vira uma etapa; objetos a criar recebem um ID provisório negativo
+    ('ref'), usado pelas etapas seguintes (interfaces da VM, IPs da interface, IPs primários)
+    e trocado pelo ID real no 'apply'.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self._next_ref = -1
+
+    def record(self, endpoint, operation, objects):
+        """Registra uma etapa e retorna os objetos como o NetBox os devolveria."""
+        entries, results = [], []
+        for obj in objects:
+            if operation == 'post':
+                entries.append({"ref": self._next_ref, "object": obj})
+                results.append({**_as_read(obj), "id": self._next_ref})
+                self._next_ref -= 1
             else:
-                print_flush(f"      Erro de Conexão: {e}")
-            print_flush("      --- Lote de Dados com Falha ---")
-            print_flush(json.dumps(batch, indent=2, ensure_ascii=False))
-            print_flush("      --- Fim do Lote de Dados ---")
+                entries.append({"object": obj})
+                if operation == 'patch':
+                    results.append(_as_read(obj))
+        self.steps.append((endpoint, operation, entries))
+        log_plan.info(f"   - PLANEJADO: {len(entries)} objeto(s) ({operation}) em /api/{endpoint}/")
+        return results
 
-    return created_objects
+    def count(self):
+        return sum(len(entries) for _, _, entries in self.steps)
 
-# === EXECUÇÃO PRINCIPAL OTIMIZADA ===
-def main():
+    def write(self, path, summary):
+        """Grava o plano em JSON Lines: um cabeçalho e uma linha por objeto, na ordem das etapas."""
+        header = {
+            "changeset": CHANGESET_VERSION, "created_at": datetime.now().isoformat(), "netbox_url": NETBOX_URL,
+            "awx_inventories": AWX_INVENTORIES, "awx_checkpoint": _run_state["awx_checkpoint"],
+            "steps": len(self.steps), "objects": self.count(), "summary": summary,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for number, (endpoint, operation, entries) in enumerate(self.steps, 1):
+                for entry in entries:
+                    f.write(json.dumps({"step": number, "endpoint": endpoint, "operation": operation, **entry},
+                                       ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, path)
+
+_changeset = None
+
+def _resolve_planned(obj, ids):
+    """Troca os IDs provisórios do objeto pelos IDs reais; None se alguma referência não foi criada."""
+    resolved = dict(obj)
+    for field in CHANGESET_REFERENCE_FIELDS:
+        if is_planned(resolved.get(field)):
+            if resolved[field] not in ids:
+                return None
+            resolved[field] = ids[resolved[field]]
+    if any(is_planned(tag) and tag not in ids for tag in resolved.get("tags") or []):
+        return None
+    if "tags" in resolved:
+        resolved["tags"] = [ids.get(tag, tag) for tag in resolved["tags"]]
+    return resolved
+
+def apply_changeset(path):
+    """Subcomando 'apply': executa as etapas de um plano em lote, sem consultar o AWX.
+
+    Objetos criados são associados aos seus IDs provisórios pela chave natural; objetos que
+    dependem de uma criação rejeitada vão para o arquivo de rejeitos sem serem enviados.
+    """
     start_time = datetime.now()
-    print_flush("INICIANDO SINCRONIZAÇÃO COMPLETA E OTIMIZADA...")
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        entries = [json.loads(line) for line in f if line.strip()]
+    if header.get("changeset") != CHANGESET_VERSION:
+        raise ValueError(f"Formato de plano não suportado em {path}: {header.get('changeset')}")
+    if header["netbox_url"].rstrip("/") != NETBOX_URL.rstrip("/"):
+        raise ValueError(f"O plano foi calculado para {header['netbox_url']}, não para {NETBOX_URL}")
 
-    vms_from_awx = list_awx_hosts()
-    if not vms_from_awx:
-        print_flush("Nenhuma VM para processar. Encerrando.")
+    log_plan.info(f"APLICANDO PLANO DE {path} (calculado em {header['created_at']})...")
+    steps = {}
+    for entry in entries:
+        steps.setdefault(entry["step"], []).append(entry)
+
+    print_phase(f"\nFASE 1: Executando {len(steps)} etapa(s) com {len(entries)} objeto(s)...")
+    ids = {}
+    summary = {}
+    for number in sorted(steps):
+        endpoint, operation = steps[number][0]["endpoint"], steps[number][0]["operation"]
+        ready, blocked = [], []
+        for entry in steps[number]:
+            obj = _resolve_planned(entry["object"], ids)
+            if obj is None:
+                blocked.append(entry["object"])
+            else:
+                ready.append((entry.get("ref"), obj))
+        if blocked:
+            _record_rejects(endpoint, operation, blocked, None, "Depende de um objeto do plano que não foi criado.")
+
+        results = bulk_api_call(endpoint, [obj for _, obj in ready], operation)
+        if operation == 'post':
+            key = NATURAL_KEYS.get(endpoint, lambda obj: obj.get("name"))
+            created = {key(obj): obj["id"] for obj in results}
+            for ref, obj in ready:
+                if key(_as_read(obj)) in created:
+                    ids[ref] = created[key(_as_read(obj))]
+        label = f"{endpoint} ({operation})"
+        summary[label] = summary.get(label, 0) + len(ready)
+
+    # O checkpoint da coleta que gerou o plano só avança se todas as escritas tiveram sucesso
+    if _run_state["failed_batches"]:
+        log_plan.warning(f"\nAVISO: {_run_state['failed_batches']} lote(s) falharam; checkpoint do AWX não foi avançado.")
+    else:
+        _run_state["awx_checkpoint"] = header.get("awx_checkpoint")
+        save_awx_checkpoint()
+
+    log_plan.info("\nPLANO APLICADO!")
+    log_plan.info(f"   - Duração total: {datetime.now() - start_time}")
+    for label, count in summary.items():
+        log_plan.info(f"   - {label}: {count} objeto(s) enviado(s)")
+    if _run_state["rejected_objects"]:
+        log_plan.info(f"   - Objetos Rejeitados: {_run_state['rejected_objects']} (detalhes em {REJECTS_PATH})")
+    if _run_state["suppressed_failures"]:
+        log_plan.warning(f"   - Falhas de lote omitidas do log: {_run_state['suppressed_failures']} (registro completo em {ERROR_DUMP_PATH})")
+    _metrics.summary.update({"objects_sent": sum(summary.values()), "rejected_objects": _run_state["rejected_objects"]})
+
+# --- RECONCILIAÇÃO (DIFF POR CAMPO) ---
+
+# Campos que referenciam outros objetos: comparados pelo ID
+REFERENCE_FIELDS = ("site", "cluster", "role", "tenant", "primary_ip4", "primary_ip6")
+
+def _ref_id(value):
+    """Extrai o ID de uma referência aninhada do NetBox ({'id': ...}) ou devolve o próprio valor."""
+    return value.get("id") if isinstance(value, dict) else value
+
+def _normalize_field(field, value):
+    """Normaliza um campo para comparação entre o payload desejado e o objeto do NetBox."""
+    if field in REFERENCE_FIELDS:
+        return _ref_id(value)
+    if field == "tags":
+        return sorted({_ref_id(tag) for tag in value or []})
+    if field == "status":
+        return value.get("value") if isinstance(value, dict) else value
+    if field == "vcpus" and value is not None:
+        return float(value)
+    return value
+
+def diff_fields(desired, current):
+    """Retorna apenas os campos de `desired` cujo valor difere do objeto atual do NetBox."""
+    return {
+        field: value for field, value in desired.items()
+        if _normalize_field(field, value) != _normalize_field(field, current.get(field))
+    }
+
+VMINTERFACE_TYPE = "virtualization.vminterface"
+
+def _assigned_interface(ip):
+    """ID da interface de VM à qual o IP está atribuído, ou None."""
+    return ip.get("assigned_object_id") if ip.get("assigned_object_type") == VMINTERFACE_TYPE else None
+
+def _ip_host(address):
+    """Endereço do host, sem a máscara ('10.0.0.5/24' -> '10.0.0.5')."""
+    try:
+        return str(ipaddress.ip_interface(address).ip)
+    except ValueError:
+        return address.split("/")[0]
+
+def diff_ips(desired, ips, managed_interfaces, keep_hosts=(), primary_ids=(), keep_ids=()):
+    """Compara os IPs desejados (endereço -> ID da interface) com os IPs atuais do NetBox, em uma passada.
+
+    Os IPs são comparados pelo endereço do host: um '10.0.0.5/24' cadastrado no NetBox atende
+    ao '10.0.0.5/32' reportado pelo AWX. Retorna (criar, reatribuir, remover):
+    - endereços ausentes no NetBox são criados na interface desejada;
+    - IPs sem atribuição ou atribuídos a outra interface gerenciada são reatribuídos;
+      IPs em objetos que a sincronização não gerencia são mantidos;
+    - IPs de interfaces gerenciadas (`managed_interfaces`) fora do estado desejado, ou
+      duplicados de um endereço já atendido, são removidos.
+
+    IPs com host em `keep_hosts` (reportado por mais de uma VM) ficam como estão. IPs
+    primários de VMs sincronizadas (`primary_ids`) nunca são reatribuídos e os de `keep_ids`
+    (primários de outra VM) nunca são removidos: o NetBox recusa mover o IP primário de uma VM.
+    """
+    wanted = {_ip_host(address): interface_id for address, interface_id in desired.items()}
+    chosen = {}
+    for ip in ips:
+        host = _ip_host(ip["address"])
+        interface_id = wanted.get(host)
+        if interface_id is None:
+            continue
+        current = chosen.get(host)
+        if current is None or (_assigned_interface(ip) == interface_id and _assigned_interface(current) != interface_id):
+            chosen[host] = ip
+
+    to_create, to_reassign = [], []
+    for address, interface_id in desired.items():
+        ip = chosen.get(_ip_host(address))
+        if ip is None:
+            to_create.append({
+                "address": address, "status": "active",
+                "assigned_object_type": VMINTERFACE_TYPE, "assigned_object_id": interface_id,
+            })
+        elif ip["id"] in primary_ids:
+            continue
+        elif _assigned_interface(ip) != interface_id and (ip.get("assigned_object_id") is None
+                                                          or _assigned_interface(ip) in managed_interfaces):
+            to_reassign.append({"id": ip["id"], "assigned_object_type": VMINTERFACE_TYPE, "assigned_object_id": interface_id})
+
+    chosen_ids = {ip["id"] for ip in chosen.values()}
+    to_delete = [
+        {"id": ip["id"]} for ip in ips
+        if _assigned_interface(ip) in managed_interfaces and ip["id"] not in chosen_ids
+        and _ip_host(ip["address"]) not in keep_hosts and ip["id"] not in keep_ids
+    ]
+    return to_create, to_reassign, to_delete
+
+# --- RESOLUÇÃO DE DEPENDÊNCIAS EM LOTE ---
+
+CLUSTER_TYPE_NAME = "VMware vSphere"
+
+def ensure_references(endpoint, wanted, key="name"):
+    """Cria, com um único POST em lote, os objetos de `wanted` (chave -> payload) ausentes no índice.
+
+    Os que o NetBox recusar ficam marcados no índice e não são recriados VM a VM.
+    """
+    missing = [
+        payload for value, payload in wanted.items()
+        if not _refs.get(endpoint, key, value) and not _refs.failed(endpoint, key, value)
+    ]
+    if not missing:
         return
+    created = bulk_api_call(endpoint, missing, 'post')
+    for obj in created:
+        _refs.add(endpoint, obj)
+    for payload in missing:
+        if not _refs.get(endpoint, key, payload[key]):
+            _refs.mark_failed(endpoint, key, payload[key])
+    log_write.info(f"   - {len(created)} dependência(s) criada(s) em '{endpoint}'.")
 
-    print_flush("\nFASE 2: Carregando estado atual do NetBox para o cache...")
-    _cache['vms'] = {vm['name']: vm for vm in _paginated_get(netbox_session, NETBOX_URL, "virtualization/virtual-machines")}
-    _cache['tags'] = {tag['slug']: tag for tag in _paginated_get(netbox_session, NETBOX_URL, "extras/tags")}
-    print_flush(f"   - Cache carregado: {len(_cache['vms'])} VMs, {len(_cache['tags'])} Tags.")
+def resolve_dependencies(vms):
+    """Pré-resolve as referências de todas as VMs, criando as ausentes com um POST por endpoint."""
+    ensure_references("dcim/sites", {
+        vm.site_name: {"name": vm.site_name, "slug": slugify(vm.site_name), "status": "active"}
+        for vm in vms if vm.site_name
+    })
+    ensure_references("virtualization/cluster-types", {
+        CLUSTER_TYPE_NAME: {"name": CLUSTER_TYPE_NAME, "slug": slugify(CLUSTER_TYPE_NAME)}
+    })
+    cluster_type = _refs.get("virtualization/cluster-types", "name", CLUSTER_TYPE_NAME)
+    clusters = {}
+    for vm in vms:
+        if vm.cluster_name and vm.cluster_name not in clusters:
+            site = _refs.get("dcim/sites", "name", vm.site_name)
+            clusters[vm.cluster_name] = {
+                "name": vm.cluster_name, "slug": slugify(vm.cluster_name),
+                "type": cluster_type and cluster_type["id"], "site": site and site["id"],
+            }
+    ensure_references("virtualization/clusters", clusters)
+    ensure_references("dcim/device-roles", {
+        vm.role: {"name": vm.role, "slug": slugify(vm.role), "color": "00bcd4", "vm_role": True}
+        for vm in vms if vm.role
+    })
+    ensure_references("tenancy/tenants", {
+        vm.tenant: {"name": vm.tenant, "slug": slugify(vm.tenant)}
+        for vm in vms if vm.tenant
+    })
+    ensure_references("extras/tags", {
+        slug: {"name": name, "slug": slug, "description": description}
+        for vm in vms for slug, name, description in vm.tags
+    }, key="slug")
+
+def vm_reference_ids(vm, create=False):
+    """IDs de site, cluster, função, tenant e tags de uma VM.
+
+    Após resolve_dependencies as consultas são atendidas só pelo índice (referências recusadas
+    ficam vazias); com `create` (modo streaming, sem pré-resolução) as ausentes são criadas
+    individualmente, uma única tentativa por referência.
+    """
+    site_id = get_or_create_dependency("dcim/sites", vm.site_name, {"status": "active"}, create)
+    cluster_type_id = get_or_create_dependency("virtualization/cluster-types", CLUSTER_TYPE_NAME, create=create)
+    tag_ids = [
+        get_or_create_dependency("extras/tags", name, {"description": description, "slug": slug}, create)
+        for slug, name, description in vm.tags
+    ]
+    return {
+        "site": site_id,
+        "cluster": get_or_create_dependency("virtualization/clusters", vm.cluster_name,
+                                            {"type": cluster_type_id, "site": site_id}, create),
+        "role": get_or_create_dependency("dcim/device-roles", vm.role, {"color": "00bcd4", "vm_role": True}, create),
+        "tenant": get_or_create_dependency("tenancy/tenants", vm.tenant, create=create),
+        "tags": [tag_id for tag_id in tag_ids if tag_id],
+    }
+
+# === EXECUÇÃO PRINCIPAL OTIMIZADA ===
+def sync_vms(awx_hosts, start_time, streaming=False, scoped=False):
+    """FASES 2 a 5: sincroniza VMs, interfaces e IPs; retorna o resumo ou None se não houver VMs.
+
+    Com `scoped` (execução particionada) só as VMs de `awx_hosts` são lidas do NetBox.
+    """
+    print_phase("\nFASE 2: Carregando estado atual do NetBox para o cache...")
+    # Estado completo lido via GraphQL (VMs, interfaces e IPs); None = leituras REST
+    state = None
+    if scoped and SCOPED_READS:
+        names = [vm.name for vm in awx_hosts]
+        vms = load_scoped_objects("virtualization/virtual-machines", "name", names, brief=False)
+    else:
+        state = load_state_graphql() if STATE_BACKEND == "graphql" and _snapshot is None else None
+        vms = state["vms"] if state is not None else load_netbox_objects("virtualization/virtual-machines")
+    _cache['vms'] = {vm['name']: vm for vm in vms}
+    log_state.info(f"   - Cache carregado: {len(_cache['vms'])} VMs, {_refs.count('extras/tags')} Tags.")
+
+    if not streaming:
+        log_state.info("   - Resolvendo dependências (sites, clusters, funções, tenants e tags) em lote...")
+        resolve_dependencies(awx_hosts)
     
-    print_flush("\nFASE 3: Preparando lotes de criação e atualização de VMs...")
-    vms_to_create, vms_to_update = [], []
-
-    for vm_data in vms_from_awx:
-        vm_name = vm_data.get("vm_name")
-        if not vm_name: continue
-
-        site_id = get_or_create_dependency("dcim/sites", DATACENTER_TO_SITE_MAP.get(vm_data["vm_datacenter"]), {"status": "active"})
-        cluster_type_id = get_or_create_dependency("virtualization/cluster-types", "VMware vSphere")
-        cluster_id = get_or_create_dependency("virtualization/clusters", CLUSTER_MAP.get(vm_data["vm_cluster"]), {"type": cluster_type_id, "site": site_id})
-        role_name = next((tag.get('name') for tag in vm_data.get("vm_tags", []) if tag.get('category') == 'Função'), None)
-        role_id = get_or_create_dependency("dcim/device-roles", role_name, {"color": "00bcd4", "vm_role": True}) if role_name else None
-        tenant_name = next((tag.get('name') for tag in vm_data.get("vm_tags", []) if tag.get('category') == 'Entidade'), None)
-        tenant_id = get_or_create_dependency("tenancy/tenants", tenant_name) if tenant_name else None
-        
-        tag_ids = []
-        for tag in vm_data.get("vm_tags", []):
-            if tag.get('name') and tag.get('category'):
-                tag_slug = slugify(f"{tag.get('category')}-{tag.get('name')}")
-                if tag_slug not in _cache['tags']:
-                    tag_id = get_or_create_dependency("extras/tags", tag.get('name'), {"description": tag.get('description', ''), "slug": tag_slug})
-                    if tag_id: _cache['tags'][tag_slug] = {'id': tag_id, 'slug': tag_slug}
-                if tag_slug in _cache['tags']:
-                    tag_ids.append(_cache['tags'][tag_slug]['id'])
-                
+    # No modo streaming a coleta do AWX acontece durante a FASE 3, que consome os hosts
+    if streaming:
+        print_phase("\nFASE 3: Coletando dados do AWX e preparando lotes de criação e atualização de VMs...")
+    else:
+        print_phase("\nFASE 3: Preparando lotes de criação e atualização de VMs...")
+    vms_to_create = BatchWriter("virtualization/virtual-machines", 'post', background=streaming)
+    vms_to_update = BatchWriter("virtualization/virtual-machines", 'patch', background=streaming)
+    vms_unchanged = 0
+    comment = f"{SYNC_COMMENT_PREFIX}: {start_time.strftime('%Y-%m-%d %H:%M:%S')}"
+
+    # Só os campos reutilizados na FASE 5 (SyncedVM)
+    vms_from_awx = []
+    for vm in awx_hosts:
+        vms_from_awx.append(SyncedVM(vm.name, vm.cluster_name, vm.addresses, vm.primary_ip4, vm.primary_ip6))
         payload = {
-            "name": vm_name, "status": "active" if vm_data.get("vm_power_state") != "poweredOff" else "offline",
-            "vcpus": vm_data.get("vm_cpu_count"), "memory": int(vm_data.get("vm_memory_mb", 0)), "disk": int(vm_data.get("vm_disk_total_gb", 0)),
-            "site": site_id, "cluster": cluster_id, "role": role_id, "tenant": tenant_id, "tags": tag_ids,
-            "comments": f"Última atualização via AWX: {start_time.strftime('%Y-%m-%d %H:%M:%S')}"
+            "name": vm.name, "status": vm.status, "vcpus": vm.vcpus, "memory": vm.memory, "disk": vm.disk,
+            **vm_reference_ids(vm, create=streaming),
         }
 
-        if vm_name in _cache['vms']:
-            payload["id"] = _cache['vms'][vm_name]["id"]
-            vms_to_update.append(payload)
+        if vm.name in _cache['vms']:
+            # Envia somente os campos alterados; VMs idênticas não geram PATCH
+            changes = diff_fields(payload, _cache['vms'][vm.name])
+            if not changes:
+                vms_unchanged += 1
+                continue
+            vms_to_update.add({"id": _cache['vms'][vm.name]["id"], **changes, "comments": comment})
         else:
-            vms_to_create.append(payload)
+            vms_to_create.add({**payload, "comments": comment})
+
+    if not vms_from_awx:
+        return None
 
-    print_flush("\nFASE 4: Executando operações em lote para VMs...")
-    created_vms = bulk_api_call("virtualization/virtual-machines", vms_to_create, 'post')
-    bulk_api_call("virtualization/virtual-machines", vms_to_update, 'patch')
+    print_phase("\nFASE 4: Executando operações em lote para VMs...")
+    created_vms = vms_to_create.close()
+    vms_to_update.close()
     
     # Atualiza o cache com as VMs recém-criadas para garantir que seus IDs estejam disponíveis
-    for vm in created_vms:
-        _cache['vms'][vm['name']] = vm
+    for created in created_vms:
+        _cache['vms'][created['name']] = created
         
-    print_flush("\nFASE 5: Sincronizando Interfaces e IPs de forma sequencial para garantir dependências...")
+    print_phase("\nFASE 5: Reconciliando Interfaces e IPs de forma sequencial para garantir dependências...")
+    synced = [vm for vm in vms_from_awx if vm.name in _cache['vms']]
 
     # ETAPA 5.1: Carregar estado atual de interfaces e IPs
-    print_flush("   - Etapa 5.1: Carregando estado atual de Interfaces e IPs...")
-    existing_interfaces = {(iface['virtual_machine']['id'], iface['name']): iface for iface in _paginated_get(netbox_session, NETBOX_URL, "virtualization/interfaces")}
-    existing_ips = {ip['address']: ip for ip in _paginated_get(netbox_session, NETBOX_URL, "ipam/ip-addresses")}
+    print_phase("   - Etapa 5.1: Carregando estado atual de Interfaces e IPs...")
+    wanted_addresses = [address for vm in synced for address in vm.addresses]
+    if state is not None:
+        # Interfaces e IPs das VMs vieram na consulta GraphQL; só os endereços desejados fora de
+        # interfaces de VMs (livres ou em outros objetos) ainda são buscados via REST
+        interfaces = state["interfaces"]
+        ips = {ip['id']: ip for ip in state["ips"]}
+        known_hosts = {_ip_host(ip['address']) for ip in state["ips"]}
+        missing_addresses = [address for address in wanted_addresses if _ip_host(address) not in known_hosts]
+        ips.update((ip['id'], ip) for ip in load_scoped_objects("ipam/ip-addresses", "address", missing_addresses, brief=False))
+    elif SCOPED_READS and _snapshot is None:
+        # Busca só as interfaces das VMs sincronizadas, os IPs atribuídos a elas e os endereços desejados
+        # VMs que o plano ainda vai criar não têm interfaces no NetBox
+        vm_ids = [_cache['vms'][vm.name]['id'] for vm in synced if not is_planned(_cache['vms'][vm.name]['id'])]
+        interfaces = load_scoped_objects("virtualization/interfaces", "virtual_machine_id", vm_ids)
+        interface_ids = [iface['id'] for iface in interfaces]
+        ips = {ip['id']: ip for ip in (
+            load_scoped_objects("ipam/ip-addresses", "vminterface_id", interface_ids, brief=False)
+            + load_scoped_objects("ipam/ip-addresses", "address", wanted_addresses, brief=False)
+        )}
+    else:
+        interfaces = load_netbox_objects("virtualization/interfaces")
+        ips = {ip['id']: ip for ip in load_netbox_objects("ipam/ip-addresses")}
+    existing_interfaces = {(iface['virtual_machine']['id'], iface['name']): iface for iface in interfaces}
 
     # ETAPA 5.2: Identificar e criar interfaces faltantes
-    print_flush("   - Etapa 5.2: Verificando e criando interfaces faltantes...")
-    interfaces_to_create = []
-    for vm_data in vms_from_awx:
-        vm_name = vm_data.get("vm_name")
-        if vm_name not in _cache['vms']: continue
-        
-        vm_id = _cache['vms'][vm_name]['id']
-        interface_name = "eth0" # Assume a interface padrão
-        
-        if (vm_id, interface_name) not in existing_interfaces:
-            interfaces_to_create.append({"name": interface_name, "virtual_machine": vm_id, "type": "1000base-t"})
-    
-    # Executa a criação em lote das interfaces
+    print_phase("   - Etapa 5.2: Verificando e criando interfaces faltantes...")
+    interface_name = "eth0" # Assume a interface padrão: o AWX não informa as placas das VMs
+    interfaces_to_create = [
+        {"name": interface_name, "virtual_machine": _cache['vms'][vm.name]['id'], "type": "1000base-t"}
+        for vm in synced if (_cache['vms'][vm.name]['id'], interface_name) not in existing_interfaces
+    ]
     created_interfaces = bulk_api_call("virtualization/interfaces", interfaces_to_create, 'post')
 
-    # ETAPA 5.3: Atualizar cache de interfaces e preparar criação de IPs
+    # ETAPA 5.3: Atualizar cache de interfaces
     if created_interfaces:
-        print_flush("   - Etapa 5.3: Atualizando cache com novas interfaces...")
-        # Adiciona as interfaces recém-criadas ao cache para uso imediato
+        print_phase("   - Etapa 5.3: Atualizando cache com novas interfaces...")
         for iface in created_interfaces:
             # A chave do cache de interface precisa do ID da VM, não do objeto VM
             if 'virtual_machine' in iface and iface['virtual_machine']:
                 existing_interfaces[(iface['virtual_machine']['id'], iface['name'])] = iface
 
-
-    print_flush("   - Etapa 5.4: Verificando e criando IPs faltantes...")
-    ips_to_create = []
-    for vm_data in vms_from_awx:
-        vm_name = vm_data.get("vm_name")
-        if vm_name not in _cache['vms']: continue
-
-        vm_id = _cache['vms'][vm_name]['id']
-        interface_name = "eth0"
-        
-        if (vm_id, interface_name) not in existing_interfaces:
+    # ETAPA 5.4: Estado desejado (endereço -> interface) contra os IPs atuais, em uma passada
+    print_phase("   - Etapa 5.4: Reconciliando IPs (criação, reatribuição e remoção)...")
+    managed_interfaces = set()
+    desired_ips = {}
+    claims = {}
+    for vm in synced:
+        # Sem endereços (VM desligada ou VMware Tools parado) não há estado desejado: os IPs ficam como estão
+        if not vm.addresses:
             continue
-
-        interface_id = existing_interfaces[(vm_id, interface_name)]['id']
-        
-        # ================= INÍCIO DA CORREÇÃO 1 =================
-        ip_addresses = vm_data.get("vm_ip_addresses", [])
-        if not ip_addresses:
+        for address in vm.addresses:
+            claims.setdefault(_ip_host(address), []).append(vm.name)
+        iface = existing_interfaces.get((_cache['vms'][vm.name]['id'], interface_name))
+        if iface is None:
             continue
-        ip_address = ip_addresses[0]
-        # ================= FIM DA CORREÇÃO 1 =================
-
-        ip_with_mask = f"{ip_address}/32"
-        if ip_with_mask not in existing_ips:
-            ips_to_create.append({
-                "address": ip_with_mask, 
-                "status": "active", 
-                "assigned_object_type": "virtualization.vminterface", 
-                "assigned_object_id": interface_id
-            })
+        managed_interfaces.add(iface['id'])
+        for address in vm.addresses:
+            desired_ips.setdefault(address, iface['id'])
+    # Endereços reportados por mais de uma VM (ex.: a ponte docker0, 172.17.0.1) não têm dono
+    # definido: ficam como estão no NetBox, em vez de alternar entre as VMs a cada execução
+    conflicts = {host for host, names in claims.items() if len(names) > 1}
+    for host in sorted(conflicts):
+        log_write.warning(f"   - AVISO: endereço {host} reportado por {len(claims[host])} VMs "
+                          f"({', '.join(claims[host][:5])}); mantido como está no NetBox.")
+    desired_ips = {address: iface_id for address, iface_id in desired_ips.items() if _ip_host(address) not in conflicts}
+    # IPs primários das VMs sincronizadas: não são movidos, nem removidos da interface de outra VM
+    primary_owners = {
+        _ref_id(_cache['vms'][vm.name].get(field)): _cache['vms'][vm.name]['id']
+        for vm in synced for field in ("primary_ip4", "primary_ip6")
+    }
+    primary_owners.pop(None, None)
+    interface_vms = {iface['id']: vm_id for (vm_id, _), iface in existing_interfaces.items()}
+    keep_ids = {
+        ip['id'] for ip in ips.values()
+        if ip['id'] in primary_owners and interface_vms.get(_assigned_interface(ip)) != primary_owners[ip['id']]
+    }
+    ips_to_create, ips_to_reassign, ips_to_delete = diff_ips(
+        desired_ips, list(ips.values()), managed_interfaces,
+        keep_hosts=conflicts, primary_ids=primary_owners.keys(), keep_ids=keep_ids,
+    )
+    if not PRUNE_IPS:
+        if ips_to_delete:
+            log_write.info(f"   - {len(ips_to_delete)} IP(s) não reportado(s) pelo AWX mantido(s) (SYNC_PRUNE_IPS=false).")
+        ips_to_delete = []
 
-    # Executa a criação em lote dos IPs
+    # Remoções primeiro, para que os endereços liberados não colidam com criações e reatribuições
+    bulk_api_call("ipam/ip-addresses", ips_to_delete, 'delete')
+    reassigned_ips = [{**ips[ip['id']], **ip} for ip in bulk_api_call("ipam/ip-addresses", ips_to_reassign, 'patch')]
     created_ips = bulk_api_call("ipam/ip-addresses", ips_to_create, 'post')
 
-    # ETAPA 5.5: Atualizar cache de IPs e definir IPs primários
-    if created_ips:
-        print_flush("   - Etapa 5.5: Atualizando cache com novos IPs...")
-        for ip in created_ips:
-            existing_ips[ip['address']] = ip
-    
-    print_flush("   - Etapa 5.6: Verificando e atualizando IPs primários das VMs...")
-    primary_ips_to_update = []
-    for vm_data in vms_from_awx:
-        vm_name = vm_data.get("vm_name")
-        if vm_name not in _cache['vms']: continue
-        
-        vm_obj = _cache['vms'][vm_name]
-        
-        # ================= INÍCIO DA CORREÇÃO 2 =================
-        ip_addresses = vm_data.get("vm_ip_addresses", [])
-        if not ip_addresses:
-            continue
-        ip_address = ip_addresses[0]
-        # ================= FIM DA CORREÇÃO 2 =================
-
-        ip_with_mask = f"{ip_address}/32"
-        if ip_with_mask not in existing_ips: continue
+    # ETAPA 5.5: Atualizar cache de IPs
+    if created_ips or reassigned_ips:
+        print_phase("   - Etapa 5.5: Atualizando cache com novos IPs...")
+    deleted_ids = {ip['id'] for ip in ips_to_delete}
+    desired_hosts = {_ip_host(address): iface_id for address, iface_id in desired_ips.items()}
+    current_ips = {
+        _ip_host(ip['address']): ip for ip in list(ips.values()) + reassigned_ips + created_ips
+        if ip['id'] not in deleted_ids and _assigned_interface(ip) is not None
+        and desired_hosts.get(_ip_host(ip['address'])) == _assigned_interface(ip)
+    }
 
-        ip_id_to_set = existing_ips[ip_with_mask]['id']
-        current_primary_ip = vm_obj.get('primary_ip4')
-        
-        if not current_primary_ip or current_primary_ip['id'] != ip_id_to_set:
-            primary_ips_to_update.append({"id": vm_obj['id'], "primary_ip4": ip_id_to_set})
+    print_phase("   - Etapa 5.6: Verificando e atualizando IPs primários das VMs...")
+    primary_ips_to_update = []
+    for vm in synced:
+        vm_obj = _cache['vms'][vm.name]
+        desired = {
+            field: current_ips[_ip_host(address)]['id']
+            for field, address in (("primary_ip4", vm.primary_ip4), ("primary_ip6", vm.primary_ip6))
+            if address and _ip_host(address) in current_ips
+        }
+        changes = diff_fields(desired, vm_obj)
+        if changes:
+            primary_ips_to_update.append({"id": vm_obj['id'], **changes})
 
     # Executa a atualização em lote dos IPs primários
     bulk_api_call("virtualization/virtual-machines", primary_ips_to_update, 'patch')
-    
-    end_time = datetime.now()
-    print_flush("\nSINCRONIZAÇÃO CONCLUÍDA!")
-    print_flush(f"   - Duração total: {end_time - start_time}")
-    print_flush(f"   - VMs Criadas: {len(vms_to_create)}")
-    print_flush(f"   - VMs Atualizadas: {len(vms_to_update)}")
-    print_flush(f"   - Interfaces Criadas: {len(interfaces_to_create)}")
-    print_flush(f"   - IPs Criados: {len(ips_to_create)}")
-    print_flush(f"   - IPs Primários Atualizados: {len(primary_ips_to_update)}")
+
+    # ETAPA 5.7: VMs que saíram do AWX (na execução particionada, feita pelo processo principal)
+    vms_pruned = pruned_ips = 0
+    if not scoped and prune_enabled():
+        print_phase("   - Etapa 5.7: Tratando VMs que saíram do AWX...")
+        vms_pruned, pruned_ips = prune_stale_vms(vms_from_awx, list(_cache['vms'].values()))
+
+    return {
+        "vms_created": vms_to_create.count, "vms_updated": vms_to_update.count, "vms_unchanged": vms_unchanged,
+        "vms_pruned": vms_pruned, "interfaces_created": len(interfaces_to_create), "ips_created": len(ips_to_create),
+        "ips_reassigned": len(ips_to_reassign), "ips_deleted": len(ips_to_delete) + pruned_ips,
+        "primary_ips_updated": len(primary_ips_to_update), "rejected_objects": _run_state["rejected_objects"],
+    }
+
+# --- PODA DE VMs QUE SAÍRAM DO AWX ---
+
+# Prefixo do campo 'comments' das VMs gravadas pela sincronização: só elas são podadas
+SYNC_COMMENT_PREFIX = "Última atualização via AWX"
+
+def prune_enabled():
+    """A poda só é segura quando a coleta do AWX viu todas as VMs dos inventários."""
+    return PRUNE_MODE != "none" and _run_state["awx_complete"]
+
+def prune_stale_vms(vms, netbox_vms=None):
+    """Aplica SYNC_PRUNE às VMs gerenciadas pela sincronização que não estão mais no AWX.
+
+    Considera apenas os clusters das VMs sincronizadas; `netbox_vms` evita reler as VMs
+    quando o estado completo já está em memória. Retorna (VMs podadas, IPs removidos).
+    """
+    clusters = (_refs.get("virtualization/clusters", "name", vm.cluster_name) for vm in vms if vm.cluster_name)
+    cluster_ids = {cluster["id"] for cluster in clusters if cluster and not is_planned(cluster["id"])}
+    if not cluster_ids:
+        return 0, 0
+    if netbox_vms is None:
+        netbox_vms = load_scoped_objects("virtualization/virtual-machines", "cluster_id", cluster_ids, brief=False)
+
+    names = {vm.name for vm in vms}
+    stale = [
+        vm for vm in netbox_vms
+        if vm["name"] not in names and _ref_id(vm.get("cluster")) in cluster_ids
+        and (vm.get("comments") or "").startswith(SYNC_COMMENT_PREFIX)
+    ]
+    if PRUNE_MODE == "offline":
+        stale = [vm for vm in stale if _normalize_field("status", vm.get("status")) != "offline"]
+        bulk_api_call("virtualization/virtual-machines", [{"id": vm["id"], "status": "offline"} for vm in stale], 'patch')
+        if stale:
+            log_prune.info(f"   - {len(stale)} VM(s) fora do AWX marcada(s) como offline.")
+        return len(stale), 0
+
+    # Remove os IPs das interfaces e depois as VMs (o NetBox remove as interfaces junto com a VM)
+    interfaces = load_scoped_objects("virtualization/interfaces", "virtual_machine_id", [vm["id"] for vm in stale])
+    ips = load_scoped_objects("ipam/ip-addresses", "vminterface_id", [iface["id"] for iface in interfaces])
+    bulk_api_call("ipam/ip-addresses", [{"id": ip["id"]} for ip in ips], 'delete')
+    bulk_api_call("virtualization/virtual-machines", [{"id": vm["id"]} for vm in stale], 'delete')
+    if stale:
+        log_prune.info(f"   - {len(stale)} VM(s) fora do AWX removida(s), com {len(ips)} IP(s).")
+    return len(stale), len(ips)
+
+# --- EXECUÇÃO PARTICIONADA ---
+
+def shard_key(vm):
+    """Partição de uma VM segundo SYNC_SHARD_BY."""
+    return getattr(vm, SHARD_BY) or "sem-particao"
+
+def shard_file_path(path, shard):
+    """Arquivo de uma partição (rejeitos, falhas): o nome de `path` com o slug da partição."""
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{slugify(shard)}{ext}"
+
+def run_shard(shard, awx_hosts, references, start_time, rate_limit):
+    """Sincroniza uma partição em um processo próprio, com sessões, cache e métricas independentes."""
+    global _snapshot, _metrics, REJECTS_PATH, ERROR_DUMP_PATH, RATE_LIMIT
+    started = time.monotonic()
+    _log_context["shard"] = shard
+    # O snapshot SQLite pertence ao processo principal; a partição lê apenas o seu escopo
+    _snapshot = None
+    _metrics = RunMetrics()
+    REJECTS_PATH = shard_file_path(REJECTS_PATH, shard)
+    ERROR_DUMP_PATH = shard_file_path(ERROR_DUMP_PATH, shard)
+    RATE_LIMIT = rate_limit
+    for key in ("rejects_file", "errors_file"):
+        if _run_state[key] is not None:
+            _run_state[key].close()
+    _run_state.update({"failed_batches": 0, "rejected_objects": 0, "rejects_file": None, "errors_file": None,
+                       "suppressed_failures": 0})
+    _refs.preload(references)
+
+    try:
+        summary = sync_vms(awx_hosts, start_time, scoped=True) or {}
+    finally:
+        # Os processos do pool encerram sem os handlers de atexit: esvazia a fila do log antes
+        _log_writer.flush()
+    _metrics.finish("success")
+    return {
+        "summary": summary, "failed_batches": _run_state["failed_batches"],
+        "suppressed_failures": _run_state["suppressed_failures"],
+        "seconds": time.monotonic() - started, "metrics": _metrics.export(),
+    }
+
+def sync_shards(awx_hosts, start_time):
+    """Resolve as dependências compartilhadas uma única vez e sincroniza as partições em paralelo.
+
+    Cada partição roda em um processo próprio (até SHARD_WORKERS simultâneos), com o índice de
+    referências já resolvido; o limite de taxa por host é dividido entre os processos.
+    Retorna o resumo consolidado e o número de lotes com falha.
+    """
+    shards = {}
+    for vm in awx_hosts:
+        shards.setdefault(shard_key(vm), []).append(vm)
+
+    print_phase("\nFASE 2: Resolvendo dependências compartilhadas (sites, clusters, funções, tenants e tags)...")
+    resolve_dependencies(awx_hosts)
+    references = _refs.export()
+
+    workers = min(SHARD_WORKERS, len(shards))
+    print_phase(f"\nFASE 3: Sincronizando {len(shards)} partição(ões) por '{SHARD_BY}' em até {workers} processo(s)...")
+    summary = dict.fromkeys(("vms_created", "vms_updated", "vms_unchanged", "vms_pruned", "interfaces_created",
+                             "ips_created", "ips_reassigned", "ips_deleted", "primary_ips_updated",
+                             "rejected_objects"), 0)
+    failed_batches = 0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {
+            executor.submit(run_shard, shard, hosts, references, start_time, RATE_LIMIT / workers): shard
+            for shard, hosts in sorted(shards.items(), key=lambda item: -len(item[1]))
+        }
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                log_shard.error(f"   - ERRO: partição '{shard}' falhou: {e}")
+                failed_batches += 1
+                continue
+            _metrics.merge(shard, result["metrics"])
+            failed_batches += result["failed_batches"]
+            _run_state["suppressed_failures"] += result["suppressed_failures"]
+            for key, value in result["summary"].items():
+                summary[key] = summary.get(key, 0) + value
+            log_shard.info(f"   - Partição '{shard}' concluída em {result['seconds']:.1f}s ({len(shards[shard])} VMs).")
+
+    if prune_enabled():
+        print_phase("\nFASE 4: Tratando VMs que saíram do AWX...")
+        summary["vms_pruned"], pruned_ips = prune_stale_vms(awx_hosts)
+        summary["ips_deleted"] += pruned_ips
+    return summary, failed_batches
+
+def print_summary(summary, duration, rejects_location, title="SINCRONIZAÇÃO CONCLUÍDA!", errors_location=None):
+    log.info(f"\n{title}")
+    log.info(f"   - Duração total: {duration}")
+    log.info(f"   - VMs Criadas: {summary['vms_created']}")
+    log.info(f"   - VMs Atualizadas: {summary['vms_updated']}")
+    log.info(f"   - VMs Sem Alteração: {summary['vms_unchanged']}")
+    log.info(f"   - VMs Fora do AWX ({PRUNE_MODE}): {summary['vms_pruned']}")
+    log.info(f"   - Interfaces Criadas: {summary['interfaces_created']}")
+    log.info(f"   - IPs Criados: {summary['ips_created']}")
+    log.info(f"   - IPs Reatribuídos: {summary['ips_reassigned']}")
+    log.info(f"   - IPs Removidos: {summary['ips_deleted']}")
+    log.info(f"   - IPs Primários Atualizados: {summary['primary_ips_updated']}")
+    if summary["rejected_objects"]:
+        log.info(f"   - Objetos Rejeitados: {summary['rejected_objects']} (detalhes em {rejects_location})")
+    if _run_state["suppressed_failures"]:
+        log.warning(f"   - Falhas de lote omitidas do log: {_run_state['suppressed_failures']} "
+                    f"(registro completo em {errors_location or ERROR_DUMP_PATH})")
+
+def collect():
+    """Subcomando 'collect': apenas a FASE 1, com um resumo por inventário, datacenter e cluster."""
+    awx_hosts = list_awx_hosts()
+    groups = {}
+    for vm in awx_hosts:
+        key = (vm.inventory, vm.datacenter, vm.cluster)
+        groups[key] = groups.get(key, 0) + 1
+
+    log.info("\nCOLETA CONCLUÍDA (nenhuma escrita no NetBox).")
+    log.info(f"   - VMs Coletadas: {len(awx_hosts)}")
+    for (inventory, datacenter, cluster), count in sorted(groups.items()):
+        log.info(f"   - {inventory} / {datacenter} / {cluster}: {count} VMs")
+    _metrics.summary.update({"vms_collected": len(awx_hosts)})
+
+def finish_without_vms():
+    log.info("Nenhuma VM para processar. Encerrando.")
+    if _changeset is not None:
+        _changeset.write(CHANGESET_PATH, {})
+    else:
+        save_awx_checkpoint()
+
+def main(plan=False):
+    """Sincronização completa; com `plan` apenas lê o AWX e o NetBox e grava as escritas em CHANGESET_PATH."""
+    global _changeset
+    start_time = datetime.now()
+    if plan:
+        log.info("CALCULANDO PLANO DE SINCRONIZAÇÃO (SEM ESCRITAS NO NETBOX)...")
+        _changeset = Changeset()
+        if SHARD_BY:
+            log.warning("   - SYNC_SHARD_BY ignorado: o plano é calculado em um único processo.")
+    else:
+        log.info("INICIANDO SINCRONIZAÇÃO COMPLETA E OTIMIZADA...")
+
+    # No modo streaming o estado do NetBox é carregado antes, e os hosts do AWX
+    # alimentam os lotes de escrita à medida que as páginas chegam; a execução
+    # particionada precisa de todos os hosts para montar as partições
+    streaming = STREAMING and not SHARD_BY and not plan
+    if streaming:
+        awx_hosts = iter_awx_hosts()
+    else:
+        awx_hosts = list_awx_hosts()
+        if not awx_hosts:
+            finish_without_vms()
+            return
+
+    if SHARD_BY and not plan:
+        summary, failed_batches = sync_shards(awx_hosts, start_time)
+        rejects_location = shard_file_path(REJECTS_PATH, "<partição>")
+        errors_location = shard_file_path(ERROR_DUMP_PATH, "<partição>")
+    else:
+        summary = sync_vms(awx_hosts, start_time, streaming=streaming)
+        failed_batches, rejects_location, errors_location = _run_state["failed_batches"], REJECTS_PATH, ERROR_DUMP_PATH
+        if summary is None:
+            finish_without_vms()
+            return
+
+    if plan:
+        _changeset.write(CHANGESET_PATH, summary)
+        _metrics.summary.update(summary)
+        print_summary(summary, datetime.now() - start_time, rejects_location, title="PLANO CALCULADO (nenhuma escrita no NetBox)!")
+        log_plan.info(f"   - Plano gravado em {CHANGESET_PATH}: {_changeset.count()} objeto(s) em {len(_changeset.steps)} etapa(s).")
+        log_plan.info(f"   - Para aplicar: python3 scripts/awx-netbox.py apply {CHANGESET_PATH}")
+        return
+
+    # O checkpoint só avança se todas as escritas no NetBox tiveram sucesso
+    _run_state["failed_batches"] = failed_batches
+    if failed_batches:
+        log.warning(f"\nAVISO: {failed_batches} lote(s) falharam; checkpoint do AWX não foi avançado.")
+    else:
+        save_awx_checkpoint()
+
+    _metrics.summary.update(summary)
+    print_summary(summary, datetime.now() - start_time, rejects_location, errors_location=errors_location)
+
+# --- MODO DAEMON (SINCRONIZAÇÃO POR EVENTOS DO AWX) ---
+
+# Estado do daemon exposto em GET /health pelo receptor de webhook
+_daemon_status = {"started_at": None, "last_sync": None, "last_full": None, "last_error": None}
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    """Receptor das notificações (webhook) do AWX: qualquer POST apenas acorda o daemon.
+
+    O corpo não é interpretado; o daemon confirma o que mudou consultando /api/v2/inventory_updates/.
+    """
+
+    wakeup = None  # threading.Event do daemon, definido em start_webhook_receiver
+
+    def _reply(self, status, body=None):
+        raw = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        expected = f"Bearer {DAEMON_WEBHOOK_TOKEN}"
+        if DAEMON_WEBHOOK_TOKEN and not hmac.compare_digest(self.headers.get("Authorization", ""), expected):
+            return self._reply(401, {"detail": "Token inválido."})
+        self.wakeup.set()
+        self._reply(202, {"detail": "Sincronização agendada."})
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/health":
+            return self._reply(404, {"detail": "Não encontrado."})
+        self._reply(200, _daemon_status)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_webhook_receiver(wakeup):
+    """Sobe o receptor de webhook em uma thread; retorna o servidor HTTP."""
+    handler = type("BoundWebhookHandler", (_WebhookHandler,), {"wakeup": wakeup})
+    server = ThreadingHTTPServer((DAEMON_WEBHOOK_ADDRESS, DAEMON_WEBHOOK_PORT), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log_daemon.info(f"   - Receptor de webhook ouvindo em {DAEMON_WEBHOOK_ADDRESS}:{server.server_address[1]} (POST qualquer caminho, GET /health).")
+    return server
+
+def latest_inventory_update():
+    """'finished' da atualização de inventário concluída mais recente no AWX, ou None."""
+    params = urlencode({"status": "successful", "order_by": "-finished", "page_size": 1})
+    results = _get_page(awx_session, f"{AWX_URL}/api/v2/inventory_updates/?{params}", "v2/inventory_updates").get("results", [])
+    return results[0]["finished"] if results else None
+
+def poll_inventory_updates(since):
+    """Atualizações de fonte de inventário concluídas com sucesso após `since`, da mais antiga à mais recente."""
+    params = {"status": "successful", "order_by": "finished", **({"finished__gt": since} if since else {})}
+    return _paginated_get(awx_session, AWX_URL, "v2/inventory_updates", params)
+
+def collect_changed_hosts(inventories, watermarks):
+    """Hosts de cada inventário com 'modified' posterior à sua marca d'água (todos, se não houver marca).
+
+    Retorna (registros, novas marcas d'água, se todas as variáveis foram lidas); as novas marcas
+    só devem substituir as atuais depois que as escritas no NetBox tiverem sucesso.
+    """
+    records, marks, complete = [], dict(watermarks), True
+    for inventory in inventories:
+        since = watermarks.get(inventory["id"])
+        params = {"modified__gt": since} if since else {}
+        if HOST_FILTER:
+            params["name__icontains"] = HOST_FILTER
+        for host in _iter_paginated(awx_session, AWX_URL, f"v2/inventories/{inventory['id']}/hosts", params):
+            marks[inventory["id"]] = max(marks.get(inventory["id"]) or "", host.get("modified") or "")
+            vars_dict = _host_vars(host)
+            if vars_dict is None:
+                complete = False
+                continue
+            record = VMRecord.from_vars(vars_dict, inventory["name"])
+            if record is not None:
+                records.append(record)
+    log_daemon.info(f"   - Coleta do AWX concluída: {len(records)} VMs encontradas.")
+    return records, marks, complete
+
+def daemon_cycle(inventories, watermarks, full, all_found=True):
+    """Um ciclo do daemon: sincroniza os hosts alterados, com as sessões e o índice de referências já aquecidos.
+
+    O ciclo completo lê todos os hosts e trata as VMs que saíram do AWX (SYNC_PRUNE); o incremental
+    lê apenas as VMs alteradas no NetBox. Retorna (marcas d'água, sucesso); em caso de falha as
+    marcas atuais são mantidas, para que o próximo ciclo repita as alterações.
+    """
+    global _metrics
+    start_time = datetime.now()
+    _metrics = RunMetrics()
+    _run_state.update({"failed_batches": 0, "rejected_objects": 0, "suppressed_failures": 0})
+
+    print_phase("FASE 1: Coletando dados do AWX...")
+    records, marks, complete = collect_changed_hosts(inventories, {} if full else watermarks)
+    _run_state["awx_complete"] = full and all_found and complete and not HOST_FILTER
+    summary = sync_vms(records, start_time, scoped=not full) if records else None
+
+    ok = not _run_state["failed_batches"]
+    if summary is None:
+        log_daemon.info("Nenhuma VM alterada. Nada a sincronizar.")
+    else:
+        _metrics.summary.update(summary)
+        print_summary(summary, datetime.now() - start_time, REJECTS_PATH)
+    _metrics.write("success" if ok else "partial")
+    _daemon_status["last_sync"] = datetime.now(timezone.utc).isoformat()
+    return (marks if ok else watermarks), ok
+
+def daemon():
+    """Subcomando 'daemon': sincroniza continuamente, a cada atualização de inventário concluída no AWX.
+
+    Uma sincronização completa inicia o daemon e se repete a cada AWX_FULL_INTERVAL. Entre elas,
+    /api/v2/inventory_updates/ é consultado a cada DAEMON_POLL_SECONDS (ou assim que chega um
+    webhook) e só os hosts alterados dos inventários atualizados são sincronizados.
+    """
+    log_daemon.info("INICIANDO SINCRONIZAÇÃO CONTÍNUA (DAEMON)...")
+    if SHARD_BY or STREAMING:
+        log_daemon.warning("   - SYNC_SHARD_BY/SYNC_STREAMING ignorados: o daemon sincroniza em um único processo.")
+    wakeup, stop = threading.Event(), threading.Event()
+
+    def request_stop(signum, frame):
+        log_daemon.info("\nEncerrando o daemon após o ciclo atual...")
+        stop.set()
+        wakeup.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    if DAEMON_WEBHOOK_PORT:
+        start_webhook_receiver(wakeup)
+
+    _daemon_status["started_at"] = datetime.now(timezone.utc).isoformat()
+    watermarks, last_full, updates_since = {}, None, None
+    while not stop.is_set():
+        try:
+            now = datetime.now(timezone.utc)
+            if last_full is None or now - last_full >= AWX_FULL_INTERVAL:
+                # O marco é lido antes da coleta: atualizações concluídas durante ela serão vistas depois
+                since = latest_inventory_update()
+                log_daemon.info(f"\n[{now:%Y-%m-%d %H:%M:%S}] SINCRONIZAÇÃO COMPLETA")
+                _refs.preload({})
+                inventories, all_found = select_awx_inventories()
+                watermarks, ok = daemon_cycle(inventories, watermarks, full=True, all_found=all_found)
+                if ok:
+                    last_full, updates_since = now, since
+                    _daemon_status["last_full"] = now.isoformat()
+            else:
+                updates = poll_inventory_updates(updates_since)
+                affected = {update["inventory"] for update in updates}
+                inventories = [inventory for inventory in select_awx_inventories()[0] if inventory["id"] in affected] if updates else []
+                ok = True
+                if inventories:
+                    names = ", ".join(inventory["name"] for inventory in inventories)
+                    log_daemon.info(f"\n[{now:%Y-%m-%d %H:%M:%S}] {len(updates)} atualização(ões) de inventário concluída(s): {names}")
+                    watermarks, ok = daemon_cycle(inventories, watermarks, full=False)
+                if updates and ok:
+                    updates_since = updates[-1]["finished"]
+            _daemon_status["last_error"] = None
+        except Exception as e:
+            log_daemon.exception(f"\nERRO NO CICLO DO DAEMON: {e}")
+            _daemon_status["last_error"] = str(e)
+            _metrics.write("failure")
+        wakeup.wait(DAEMON_POLL_SECONDS)
+        wakeup.clear()
+    log_daemon.info("DAEMON ENCERRADO.")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sincroniza as VMs dos inventários VMware do AWX com o NetBox.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("sync", help="sincronização completa (padrão)")
+    subparsers.add_parser("collect", help="apenas coleta do AWX, sem escrita no NetBox")
+    subparsers.add_parser("plan", help=f"calcula as escritas sem gravar no NetBox e as salva em SYNC_CHANGESET_PATH ({CHANGESET_PATH})")
+    apply_parser = subparsers.add_parser("apply", help="executa um plano gravado por 'plan', sem consultar o AWX")
+    apply_parser.add_argument("path", nargs="?", default=CHANGESET_PATH, help="arquivo do plano")
+    subparsers.add_parser("daemon", help="sincronização contínua a cada atualização de inventário do AWX")
+    replay_parser = subparsers.add_parser("replay-rejects", help="reenvia os objetos de um arquivo de rejeitos")
+    replay_parser.add_argument("paths", nargs="*", default=[REJECTS_PATH], help="arquivos de rejeitos (um por partição, na execução particionada)")
+    args = parser.parse_args()
+
     try:
-        main()
+        if args.command == "collect":
+            collect()
+        elif args.command == "plan":
+            main(plan=True)
+        elif args.command == "apply":
+            apply_changeset(args.path)
+        elif args.command == "daemon":
+            # Cada ciclo grava o próprio relatório e métricas
+            daemon()
+            sys.exit(0)
+        elif args.command == "replay-rejects":
+            for path in args.paths:
+                replay_rejects(path)
+        else:
+            main()
     except Exception as e:
-        print_flush(f"\nERRO FATAL NO SCRIPT: {e}")
-        traceback.print_exc()
-        sys.exit(1)
\ No newline at end of file
+        log.exception(f"\nERRO FATAL NO SCRIPT: {e}")
+        _metrics.write("failure")
+        sys.exit(1)
+    _metrics.write("success" if not _run_state["failed_batches"] else "partial")
\ No newline at end of file
@@ -6,19 +6,135 @@ Versão simplificada para testes rápidos
 """
 
 import requests
+import gzip
 import json
 import os
+import textwrap
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from urllib3.exceptions import InsecureRequestWarning
+from http_cache import CachingAdapter, ResponseCache
 
 # Desabilitar warnings SSL
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+# Compressão zstd opcional da saída (.zst)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Tamanho máximo de página aceito pela API do AWX
+PAGE_SIZE = 200
+
+class HostRecord:
+    """Registro compacto de um host: só os campos exibidos/exportados, sem o dicionário de variáveis"""
+
+    __slots__ = ('id', 'name', 'description', 'enabled', 'groups', 'ansible_host', 'vm_name', 'vm_guest_os',
+                 'vm_power_state', 'vm_cpu_count', 'vm_memory_gb', 'vm_datacenter', 'vm_cluster', 'vm_uuid',
+                 'vm_ip_addresses')
+
+    def __init__(self, host_data, variables, groups):
+        self.id = host_data['id']
+        self.name = host_data['name']
+        self.description = host_data.get('description', '')
+        self.enabled = host_data['enabled']
+        self.groups = groups
+        # Extrair informações úteis das variáveis
+        self.ansible_host = variables.get('ansible_host', '')
+        self.vm_name = variables.get('vm_name', '')
+        self.vm_guest_os = variables.get('vm_guest_os', '')
+        self.vm_power_state = variables.get('vm_power_state', '')
+        self.vm_cpu_count = variables.get('vm_cpu_count', '')
+        self.vm_memory_gb = variables.get('vm_memory_gb', '')
+        self.vm_datacenter = variables.get('vm_datacenter', '')
+        self.vm_cluster = variables.get('vm_cluster', '')
+        self.vm_uuid = variables.get('vm_uuid', '')
+        self.vm_ip_addresses = variables.get('vm_ip_addresses', [])
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+def open_output(path, target=None):
+    """Abre o arquivo de saída em modo texto, comprimindo conforme a extensão de path (.gz ou .zst)
+
+    Com target, grava nesse arquivo (ex.: o temporário) no formato definido por path.
+    """
+    target = target or path
+    if path.endswith('.gz'):
+        return gzip.open(target, 'wt', encoding='utf-8')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("a compressão .zst requer o pacote 'zstandard' (pip install zstandard)")
+        return zstandard.open(target, 'wt', encoding='utf-8')
+    return open(target, 'w', encoding='utf-8')
+
+class HostExporter:
+    """Grava os hosts à medida que são coletados, sem manter a lista em memória
+
+    Arquivos .jsonl (JSON Lines) recebem um host por linha, legível incrementalmente;
+    os demais, a lista JSON indentada do formato original. A gravação é feita em um arquivo
+    temporário, renomeado para path só quando a coleta termina sem erros; como gerenciador
+    de contexto, uma exceção descarta o temporário e mantém o arquivo anterior.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = path + '.tmp'
+        self.json_lines = '.jsonl' in os.path.basename(path)
+        self.count = 0
+        self._file = open_output(path, self.temp_path)
+        if not self.json_lines:
+            self._file.write('[')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write(self, host):
+        data = host.to_dict()
+        if self.json_lines:
+            self._file.write(json.dumps(data, ensure_ascii=False) + '\n')
+        else:
+            separator = ',\n' if self.count else '\n'
+            self._file.write(separator + textwrap.indent(json.dumps(data, indent=2, ensure_ascii=False), '  '))
+        self.count += 1
+
+    def close(self):
+        """Finaliza a lista JSON, fecha o arquivo e o move para o destino"""
+        try:
+            if not self.json_lines:
+                self._file.write('\n]' if self.count else ']')
+        finally:
+            self._file.close()
+        os.replace(self.temp_path, self.path)
+
+    def discard(self):
+        """Fecha e remove o arquivo temporário incompleto"""
+        try:
+            self._file.close()
+        finally:
+            if os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+
 class SimpleAWXCollector:
-    def __init__(self, awx_url, awx_user, awx_password):
+    def __init__(self, awx_url, awx_user, awx_password, max_workers=1, cache=None):
         self.awx_url = awx_url.rstrip('/')
         self.awx_user = awx_user
         self.awx_password = awx_password
+        self.max_workers = max(1, max_workers)
+        self.cache = cache
         self.session = requests.Session()
+        # Com cache, as leituras passam pelo ResponseCache (scripts/http_cache.py)
+        pool_maxsize = max(10, self.max_workers)
+        adapter = CachingAdapter(cache, pool_maxsize=pool_maxsize) if cache else requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.auth = (awx_user, awx_password)
         self.session.verify = False
         
@@ -30,7 +146,7 @@ class SimpleAWXCollector:
         try:
             print("🔍 Testando conectividade com AWX...")
             url = f"{self.awx_url}/api/v2/"
-            response = self.session.get(url)
+            response = self.session.get(url, headers={'Cache-Control': 'no-cache'})
             response.raise_for_status()
             
             user_info = response.json().get('current_user', {})
@@ -40,19 +156,39 @@ class SimpleAWXCollector:
             print(f"❌ Erro de conectividade: {e}")
             return False
     
+    def _iter_paginated(self, path, params=None):
+        """Entrega os registros de um endpoint da API página a página, seguindo os links 'next'"""
+        url = f"{self.awx_url}{path}"
+        params = {'page_size': PAGE_SIZE, **(params or {})}
+        while url:
+            response = self.session.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            yield from data['results']
+            next_url = data.get('next')
+            url = f"{self.awx_url}{next_url}" if next_url and next_url.startswith('/') else next_url
+            params = None  # O link 'next' já carrega os parâmetros
+
+    def _paginated_get(self, path, params=None):
+        """Busca todas as páginas de um endpoint da API"""
+        return list(self._iter_paginated(path, params))
+
+    def _map(self, func, items):
+        """Aplica func aos itens, em paralelo quando max_workers > 1, preservando a ordem"""
+        if self.max_workers == 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(func, items))
+
     def list_inventories(self):
         """Lista todos os inventários"""
         try:
             print("\n📦 Buscando inventários...")
-            url = f"{self.awx_url}/api/v2/inventories/"
-            response = self.session.get(url)
-            response.raise_for_status()
-            
-            data = response.json()
-            print(f"📋 Encontrados {data['count']} inventário(s):")
+            results = self._paginated_get("/api/v2/inventories/")
+            print(f"📋 Encontrados {len(results)} inventário(s):")
             
             inventories = []
-            for inv in data['results']:
+            for inv in results:
                 print(f"   - {inv['name']} (ID: {inv['id']}) - {inv.get('description', 'Sem descrição')}")
                 inventories.append({
                     'id': inv['id'],
@@ -66,33 +202,55 @@ class SimpleAWXCollector:
             print(f"❌ Erro ao buscar inventários: {e}")
             return []
     
-    def get_inventory_hosts(self, inventory_id, inventory_name):
-        """Busca hosts de um inventário específico"""
+    def get_inventory_hosts(self, inventory_id, inventory_name, verbose=True):
+        """Busca hosts de um inventário específico com variáveis e grupos em lote"""
         try:
-            print(f"\n🖥️ Buscando hosts do inventário '{inventory_name}' (ID: {inventory_id})...")
-            url = f"{self.awx_url}/api/v2/inventories/{inventory_id}/hosts/"
-            response = self.session.get(url)
-            response.raise_for_status()
-            
-            data = response.json()
-            hosts = data['results']
-            print(f"📊 Encontrados {len(hosts)} host(s):")
-            
-            host_list = []
-            for host in hosts:
-                status = "🟢" if host['enabled'] else "🔴"
-                print(f"   {status} {host['name']} (ID: {host['id']})")
-                
-                # Buscar detalhes do host
-                host_details = self.get_host_details(host['id'])
-                if host_details:
-                    host_list.append(host_details)
-            
-            return host_list
+            return list(self.iter_inventory_hosts(inventory_id, inventory_name, verbose))
         except Exception as e:
             print(f"❌ Erro ao buscar hosts do inventário {inventory_id}: {e}")
             return []
     
+    def iter_inventory_hosts(self, inventory_id, inventory_name, verbose=False):
+        """Entrega os hosts de um inventário à medida que as páginas chegam (com verbose, lista cada host)
+
+        Os grupos vêm de summary_fields; se o AWX os truncou para algum host, faz uma
+        única passada pelos grupos do inventário, em vez de consultar /hosts/{id}/groups/.
+        Falhas da API interrompem a iteração com a exceção: a coleta ficou incompleta.
+        """
+        print(f"\n🖥️ Buscando hosts do inventário '{inventory_name}' (ID: {inventory_id})...")
+        membership = None
+        count = 0
+        # A listagem de /hosts/ já traz as variáveis: dispensa um GET por host
+        for host in self._iter_paginated("/api/v2/hosts/", {'inventory': inventory_id}):
+            summary = host.get('summary_fields', {}).get('groups', {})
+            results = summary.get('results', [])
+            groups = [group['name'] for group in results]
+            if summary.get('count', len(results)) > len(results):
+                if membership is None:
+                    membership = self.get_inventory_group_membership(inventory_id)
+                groups = membership.get(host['id'], [])
+            
+            if verbose:
+                status = "🟢" if host['enabled'] else "🔴"
+                print(f"   {status} {host['name']} (ID: {host['id']})")
+            count += 1
+            yield self._build_host_info(host, groups)
+        print(f"📊 Encontrados {count} host(s) em '{inventory_name}'")
+    
+    def get_inventory_group_membership(self, inventory_id):
+        """Mapeia ID do host -> nomes dos grupos com uma passada pelos grupos do inventário"""
+        groups = self._paginated_get(f"/api/v2/inventories/{inventory_id}/groups/")
+        members = self._map(lambda group: self._paginated_get(f"/api/v2/groups/{group['id']}/hosts/"), groups)
+        groups_by_host = {}
+        for group, group_hosts in zip(groups, members):
+            for host in group_hosts:
+                groups_by_host.setdefault(host['id'], []).append(group['name'])
+        return groups_by_host
+    
+    def get_hosts_details(self, host_ids):
+        """Busca detalhes de vários hosts, em paralelo quando max_workers > 1"""
+        return [host for host in self._map(self.get_host_details, host_ids) if host]
+    
     def get_host_details(self, host_id):
         """Busca detalhes completos de um host"""
         try:
@@ -100,53 +258,27 @@ class SimpleAWXCollector:
             response = self.session.get(url)
             response.raise_for_status()
             
-            host_data = response.json()
-            
-            # Parse das variáveis
-            variables = {}
-            if host_data.get('variables'):
-                try:
-                    variables = json.loads(host_data['variables'])
-                except:
-                    variables = {}
-            
-            # Buscar grupos
-            groups = self.get_host_groups(host_id)
-            
-            host_info = {
-                'id': host_data['id'],
-                'name': host_data['name'],
-                'description': host_data.get('description', ''),
-                'enabled': host_data['enabled'],
-                'variables': variables,
-                'groups': groups,
-                # Extrair informações úteis das variáveis
-                'ansible_host': variables.get('ansible_host', ''),
-                'vm_name': variables.get('vm_name', ''),
-                'vm_guest_os': variables.get('vm_guest_os', ''),
-                'vm_power_state': variables.get('vm_power_state', ''),
-                'vm_cpu_count': variables.get('vm_cpu_count', ''),
-                'vm_memory_gb': variables.get('vm_memory_gb', ''),
-                'vm_datacenter': variables.get('vm_datacenter', ''),
-                'vm_cluster': variables.get('vm_cluster', ''),
-                'vm_uuid': variables.get('vm_uuid', ''),
-                'vm_ip_addresses': variables.get('vm_ip_addresses', [])
-            }
-            
-            return host_info
+            return self._build_host_info(response.json(), self.get_host_groups(host_id))
         except Exception as e:
             print(f"❌ Erro ao buscar detalhes do host {host_id}: {e}")
             return None
     
+    def _build_host_info(self, host_data, groups):
+        """Monta o HostRecord a partir do JSON do host e seus grupos; as variáveis são descartadas após o parse"""
+        # Parse das variáveis
+        variables = {}
+        if host_data.get('variables'):
+            try:
+                variables = json.loads(host_data['variables'])
+            except:
+                variables = {}
+        
+        return HostRecord(host_data, variables, groups)
+    
     def get_host_groups(self, host_id):
         """Busca grupos de um host"""
         try:
-            url = f"{self.awx_url}/api/v2/hosts/{host_id}/groups/"
-            response = self.session.get(url)
-            response.raise_for_status()
-            
-            data = response.json()
-            return [group['name'] for group in data['results']]
+            return [group['name'] for group in self._paginated_get(f"/api/v2/hosts/{host_id}/groups/")]
         except Exception as e:
             print(f"❌ Erro ao buscar grupos do host {host_id}: {e}")
             return []
@@ -154,29 +286,29 @@ class SimpleAWXCollector:
     def display_host_details(self, host):
         """Exibe detalhes formatados de um host"""
         print(f"\n" + "="*60)
-        print(f"🖥️ Host: {host['name']} (ID: {host['id']})")
-        print(f"📝 Descrição: {host['description']}")
-        print(f"🔛 Habilitado: {'Sim' if host['enabled'] else 'Não'}")
-        print(f"📡 IP Ansible: {host['ansible_host']}")
+        print(f"🖥️ Host: {host.name} (ID: {host.id})")
+        print(f"📝 Descrição: {host.description}")
+        print(f"🔛 Habilitado: {'Sim' if host.enabled else 'Não'}")
+        print(f"📡 IP Ansible: {host.ansible_host}")
         
-        if host['vm_name']:
+        if host.vm_name:
             print(f"\n🖼️ Informações da VM:")
-            print(f"   Nome da VM: {host['vm_name']}")
-            print(f"   Sistema Operacional: {host['vm_guest_os']}")
-            print(f"   Estado: {host['vm_power_state']}")
-            print(f"   CPU: {host['vm_cpu_count']}")
-            print(f"   Memória: {host['vm_memory_gb']} GB")
-            print(f"   Datacenter: {host['vm_datacenter']}")
-            print(f"   Cluster: {host['vm_cluster']}")
-            print(f"   UUID: {host['vm_uuid']}")
-            if host['vm_ip_addresses']:
-                print(f"   IPs: {', '.join(host['vm_ip_addresses'])}")
+            print(f"   Nome da VM: {host.vm_name}")
+            print(f"   Sistema Operacional: {host.vm_guest_os}")
+            print(f"   Estado: {host.vm_power_state}")
+            print(f"   CPU: {host.vm_cpu_count}")
+            print(f"   Memória: {host.vm_memory_gb} GB")
+            print(f"   Datacenter: {host.vm_datacenter}")
+            print(f"   Cluster: {host.vm_cluster}")
+            print(f"   UUID: {host.vm_uuid}")
+            if host.vm_ip_addresses:
+                print(f"   IPs: {', '.join(host.vm_ip_addresses)}")
         
-        if host['groups']:
-            print(f"\n👥 Grupos: {', '.join(host['groups'])}")
+        if host.groups:
+            print(f"\n👥 Grupos: {', '.join(host.groups)}")
         
         print(f"\n🔧 Comando para detalhes via API:")
-        print(f"curl -u '{self.awx_user}:****' '{self.awx_url}/api/v2/hosts/{host['id']}/' | jq '.'")
+        print(f"curl -u '{self.awx_user}:****' '{self.awx_url}/api/v2/hosts/{host.id}/' | jq '.'")
 
 def main():
     # Configurações
@@ -187,6 +319,18 @@ def main():
     # Filtros opcionais
     INVENTORY_FILTER = os.getenv('INVENTORY_FILTER', 'VMware Inventory')  # Nome do inventário
     HOST_FILTER = os.getenv('HOST_FILTER', '')  # Filtro por nome do host
+    MAX_WORKERS = int(os.getenv('AWX_MAX_WORKERS', '4'))  # Requisições paralelas
+    
+    # Cache de respostas em disco entre execuções (vazio = desativado) e por quantos segundos as
+    # respostas são reutilizadas sem consultar o AWX (0 = sempre revalida com ETag/Last-Modified)
+    HTTP_CACHE_PATH = os.getenv('AWX_HTTP_CACHE_PATH', '')
+    HTTP_CACHE_TTL = int(os.getenv('AWX_HTTP_CACHE_TTL', '0'))
+    
+    # Arquivo de saída, gravado host a host durante a coleta: .jsonl (um host por linha) ou .json (lista);
+    # com .gz ou .zst no final a saída é comprimida (zstd requer o pacote 'zstandard')
+    OUTPUT_FILE = os.getenv('AWX_OUTPUT_FILE', 'awx_hosts_data.json')
+    # Lista e detalha cada host no console; por padrão só o resumo é exibido
+    HOST_DETAILS = os.getenv('AWX_HOST_DETAILS', 'false').lower() in ('1', 'true', 'yes')
     
     print("🚀 Coletor Simples AWX - Iniciando...")
     print(f"🔗 AWX URL: {AWX_URL}")
@@ -195,7 +339,8 @@ def main():
     print(f"🖥️ Filtro de host: {HOST_FILTER if HOST_FILTER else 'Nenhum'}")
     
     # Inicializar coletor
-    collector = SimpleAWXCollector(AWX_URL, AWX_USER, AWX_PASSWORD)
+    cache = ResponseCache(HTTP_CACHE_PATH, default_ttl=HTTP_CACHE_TTL) if HTTP_CACHE_PATH else None
+    collector = SimpleAWXCollector(AWX_URL, AWX_USER, AWX_PASSWORD, max_workers=MAX_WORKERS, cache=cache)
     
     # Listar inventários
     inventories = collector.list_inventories()
@@ -220,36 +365,52 @@ def main():
     for inv in target_inventories:
         print(f"   - {inv['name']}")
     
-    # Coletar hosts
-    all_hosts = []
-    for inventory in target_inventories:
-        hosts = collector.get_inventory_hosts(inventory['id'], inventory['name'])
-        all_hosts.extend(hosts)
+    try:
+        exporter = HostExporter(OUTPUT_FILE)
+    except Exception as e:
+        print(f"❌ Erro ao criar arquivo de saída: {e}")
+        return
     
-    # Aplicar filtro de host
-    if HOST_FILTER:
-        filtered_hosts = [h for h in all_hosts if HOST_FILTER.lower() in h['name'].lower()]
-    else:
-        filtered_hosts = all_hosts
+    # Coletar, filtrar e gravar os hosts à medida que as páginas chegam; só os contadores ficam em memória
+    total_hosts = 0
+    enabled = Counter()
+    power_states = Counter()
+    clusters = Counter()
+    completed = False
+    try:
+        with exporter:
+            for inventory in target_inventories:
+                for host in collector.iter_inventory_hosts(inventory['id'], inventory['name'], verbose=HOST_DETAILS):
+                    total_hosts += 1
+                    if HOST_FILTER and HOST_FILTER.lower() not in host.name.lower():
+                        continue
+                    if HOST_DETAILS:
+                        collector.display_host_details(host)
+                    exporter.write(host)
+                    enabled['Sim' if host.enabled else 'Não'] += 1
+                    power_states[host.vm_power_state or 'desconhecido'] += 1
+                    clusters[host.vm_cluster or 'sem cluster'] += 1
+        completed = True
+        print(f"\n💾 Dados salvos em: {OUTPUT_FILE}")
+    except Exception as e:
+        print(f"❌ Erro na coleta ou gravação dos hosts ({OUTPUT_FILE} não foi alterado): {e}")
     
     print(f"\n📊 Resumo:")
-    print(f"   Total de hosts encontrados: {len(all_hosts)}")
-    print(f"   Hosts após filtro: {len(filtered_hosts)}")
+    print(f"   Total de hosts encontrados: {total_hosts}")
+    print(f"   Hosts após filtro: {exporter.count}")
+    if exporter.count:
+        print(f"   Habilitados: {enabled['Sim']} | Desabilitados: {enabled['Não']}")
+        print(f"   Estado das VMs: {', '.join(f'{state}: {n}' for state, n in power_states.most_common())}")
+        print(f"   Clusters: {', '.join(f'{cluster}: {n}' for cluster, n in clusters.most_common(10))}")
     
-    # Exibir detalhes dos hosts
-    for host in filtered_hosts:
-        collector.display_host_details(host)
+    if cache:
+        print(f"\n🗄️ Cache HTTP: {cache.stats['hit']} resposta(s) reutilizada(s), "
+              f"{cache.stats['revalidated']} revalidada(s), {cache.stats['miss']} do servidor")
     
-    # Salvar dados em JSON (opcional)
-    output_file = 'awx_hosts_data.json'
-    try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(filtered_hosts, f, indent=2, ensure_ascii=False)
-        print(f"\n💾 Dados salvos em: {output_file}")
-    except Exception as e:
-        print(f"❌ Erro ao salvar arquivo: {e}")
-    
-    print(f"\n✅ Coleta concluída! {len(filtered_hosts)} host(s) processado(s).")
+    if completed:
+        print(f"\n✅ Coleta concluída! {exporter.count} host(s) processado(s).")
+    else:
+        print(f"\n⚠️ Coleta interrompida após {exporter.count} host(s); nenhum arquivo foi gravado.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Cache de respostas HTTP (GET) para as sessões do AWX e do NetBox, montado como adaptador do Requests.
+
+- memória (LRU limitada em bytes) e, opcionalmente, disco (SQLite, LRU limitada em entradas);
+- chave: URL completa (com a query) e um hash da credencial enviada, sem guardar a credencial;
+- política por endpoint: TTL em segundos durante o qual a resposta é servida localmente. Vencido o
+  TTL (ou com TTL 0), a resposta é revalidada com If-None-Match/If-Modified-Since quando o servidor
+  enviou ETag/Last-Modified; TTL negativo desativa o cache do endpoint;
+- escritas bem-sucedidas (POST/PUT/PATCH/DELETE) invalidam as respostas do mesmo endpoint;
+- 'Cache-Control: no-cache' na requisição ignora o TTL e consulta o servidor.
+
+Uso:
+    cache = ResponseCache("http_cache.sqlite", policies={"dcim/sites": 3600})
+    session.mount("https://", CachingAdapter(cache, pool_maxsize=10))
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Cabeçalho acrescentado às respostas cacheáveis: 'hit' (servida sem acessar o servidor),
+# 'revalidated' (servidor respondeu 304) ou 'miss' (resposta completa do servidor)
+CACHE_HEADER = "X-Sync-Cache"
+
+# Cabeçalhos que não valem para o corpo já decodificado guardado no cache
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie", CACHE_HEADER.lower()}
+
+# Gravações no disco entre duas podas da LRU
+DISK_EVICTION_INTERVAL = 100
+
+
+def endpoint_of(url):
+    """Endpoint de uma URL da API, sem o prefixo /api/ (ex.: 'dcim/sites', 'v2/inventories/3/hosts')."""
+    return urlsplit(url).path.split("/api/", 1)[-1].strip("/")
+
+
+def _model_of(url):
+    """Endpoint sem os IDs finais: a escrita em 'dcim/sites/5' invalida também a listagem 'dcim/sites'."""
+    segments = endpoint_of(url).split("/")
+    while segments and segments[-1].isdigit():
+        segments.pop()
+    return "/".join(segments)
+
+
+class ResponseCache:
+    """Respostas GET em memória e, com `path`, em um arquivo SQLite compartilhado entre execuções."""
+
+    def __init__(self, path="", memory_bytes=128 * 1024 * 1024, max_entries=10000, policies=None, default_ttl=0):
+        # Prefixos mais longos primeiro: 'v2/inventories/3' prevalece sobre 'v2/inventories'
+        self.policies = sorted((policies or {}).items(), key=lambda item: -len(item[0]))
+        self.default_ttl = default_ttl
+        self.memory_bytes = memory_bytes
+        self.max_entries = max_entries
+        self.stats = Counter()
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, status INTEGER NOT NULL, headers TEXT NOT NULL,
+                    body BLOB NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_responses_endpoint ON responses (endpoint);
+                CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at);
+            """)
+
+    def ttl_for(self, url):
+        """TTL da política do endpoint (prefixo mais longo que casa), ou o TTL padrão."""
+        endpoint = endpoint_of(url)
+        for prefix, ttl in self.policies:
+            if endpoint == prefix or endpoint.startswith(prefix + "/"):
+                return ttl
+        return self.default_ttl
+
+    @staticmethod
+    def key(request):
+        credential = request.headers.get("Authorization", "")
+        return hashlib.sha256(f"{request.url}\0{credential}".encode()).hexdigest()
+
+    def get(self, key):
+        """Entrada do cache (memória, depois disco), ou None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT endpoint, status, headers, body, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            with self._db:
+                self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            entry = {"endpoint": row[0], "status": row[1], "headers": json.loads(row[2]),
+                     "body": zlib.decompress(row[3]), "stored_at": row[4]}
+            self._remember(key, entry)
+            return entry
+
+    def put(self, key, url, response):
+        entry = {
+            "endpoint": endpoint_of(url), "status": response.status_code, "body": response.content,
+            "headers": {name: value for name, value in response.headers.items() if name.lower() not in DROPPED_HEADERS},
+            "stored_at": time.time(),
+        }
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is None:
+                return
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, entry["endpoint"], entry["status"], json.dumps(entry["headers"]),
+                     zlib.compress(entry["body"], 1), entry["stored_at"], entry["stored_at"]),
+                )
+                self._writes += 1
+                if self._writes % DISK_EVICTION_INTERVAL == 0:
+                    self._db.execute("DELETE FROM responses WHERE key NOT IN "
+                                     "(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT ?)", (self.max_entries,))
+
+    def touch(self, key):
+        """Renova a entrada após uma revalidação (304)."""
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                self._memory[key]["stored_at"] = now
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+
+    def invalidate(self, url):
+        """Descarta as respostas do endpoint escrito (e de seus sub-recursos)."""
+        model = _model_of(url)
+        with self._lock:
+            for key in [key for key, entry in self._memory.items()
+                        if entry["endpoint"] == model or entry["endpoint"].startswith(model + "/")]:
+                self._memory_size -= len(self._memory.pop(key)["body"])
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM responses WHERE endpoint = ? OR endpoint LIKE ?", (model, f"{model}/%"))
+
+    def _remember(self, key, entry):
+        """Guarda a entrada na memória, descartando as menos usadas além de `memory_bytes` (chamar com o lock)."""
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous["body"])
+        if len(entry["body"]) > self.memory_bytes:
+            return
+        self._memory[key] = entry
+        self._memory_size += len(entry["body"])
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted["body"])
+
+
+class CachingAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter que atende os GET pelo ResponseCache, revalidando as respostas quando o TTL venceu."""
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request, **kwargs):
+        if request.method != "GET":
+            response = super().send(request, **kwargs)
+            if response.status_code < 400:
+                self.cache.invalidate(request.url)
+            return response
+
+        ttl = self.cache.ttl_for(request.url)
+        # 'Cache-Control: no-cache' na requisição exige a resposta atual do servidor (revalida, se possível)
+        if "no-cache" in request.headers.get("Cache-Control", ""):
+            ttl = min(ttl, 0)
+        if ttl < 0:
+            return super().send(request, **kwargs)
+
+        key = self.cache.key(request)
+        entry = self.cache.get(key)
+        if entry is not None and time.time() - entry["stored_at"] < ttl:
+            return self._from_cache(request, entry, "hit")
+        if entry is not None:
+            headers = CaseInsensitiveDict(entry["headers"])
+            if headers.get("ETag"):
+                request.headers["If-None-Match"] = headers["ETag"]
+            if headers.get("Last-Modified"):
+                request.headers["If-Modified-Since"] = headers["Last-Modified"]
+
+        response = super().send(request, **kwargs)
+        if entry is not None and response.status_code == 304:
+            response.close()
+            self.cache.touch(key)
+            return self._from_cache(request, entry, "revalidated")
+        # Sem TTL, só vale guardar respostas que o servidor sabe revalidar
+        if response.status_code == 200 and (ttl > 0 or "ETag" in response.headers or "Last-Modified" in response.headers):
+            self.cache.put(key, request.url, response)
+        self.cache.stats["miss"] += 1
+        response.headers[CACHE_HEADER] = "miss"
+        return response
+
+    def _from_cache(self, request, entry, outcome):
+        self.cache.stats[outcome] += 1
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict({**entry["headers"], CACHE_HEADER: outcome})
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = entry["body"]
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response